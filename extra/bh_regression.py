@@ -1,58 +1,70 @@
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.datasets import load_boston
+from local_datasets import load_boston
 import numpy as np
 import xgboost as xgb
 
-## 1. IMPORT THE DATA
-
-# unpack the dataset with return_X_y so that we only get the tuple (data, target) (i.e. predictors and responses)
-X, y = load_boston(return_X_y = True)
-
-## 2. SPLIT TEST/TRAIN
-
-# split into testing and training data; returns numpy arrays
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = .3)
-
-## 3. MODEL GENERATION
-
-# create a LinearRegression and XGBoost model and fit it against our data
-lm = LinearRegression().fit(X_train, y_train)
-xgbm = xgb.XGBRegressor(
-    objective= 'reg:squarederror', 
-    learning_rate= 0.1,
-    max_depth= 5,
-    alpha= 10,
-    n_estimators= 10
-).fit(X_train, y_train)
-
-# store model information so we can loop quickly
-models = { 'LinearRegression': lm, 'XGBoost': xgbm }
-
-## 4. PREDICTION
-
-for name, model in models.items():
-    # predict responses using the linear model on the X_train set
-    y_train_predict = model.predict(X_train)
-    # calculate root means squared error
-    rmse = (np.sqrt(mean_squared_error(y_train, y_train_predict)))
-    # calculate r-squared
-    r2 = r2_score(y_train, y_train_predict)
-
-    print('{} model performance for training set'.format(name))
-    print('--------------------------------------')
-    print('RMSE is {}'.format(rmse))
-    print('R2 score is {}'.format(r2))
-    print('\n')
-
-    # model evaluation for testing set
-    y_test_predict = model.predict(X_test)
-    rmse = (np.sqrt(mean_squared_error(y_test, y_test_predict)))
-    r2 = r2_score(y_test, y_test_predict)
-
-    print('{} model performance for training set'.format(name))
-    print('--------------------------------------')
-    print('RMSE is {}'.format(rmse))
-    print('R2 score is {}'.format(r2))
-    print('\n')
\ No newline at end of file
+from model_cache import ModelCache
+from model_harness import evaluate, report, save_models, train_models
+from model_search import cached_successive_halving, grid
+
+## fixed split seed so that repeated runs train on identical data and can reuse cached models
+SEED = 3006
+
+def main():
+    ## 1. IMPORT THE DATA
+
+    # load the bundled CSV as the tuple (data, target) (i.e. predictors and responses); cached as memory-mapped .npy
+    X, y = load_boston()
+
+    ## 2. SPLIT TEST/TRAIN
+
+    # split into testing and training data; returns numpy arrays
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = .3, random_state = SEED)
+    splits = { 'training': (X_train, y_train), 'testing': (X_test, y_test) }
+
+    ## 3. HYPERPARAMETER SEARCH
+
+    # cross-validate candidates on the training set only; XGBoost candidates are raced on a growing n_estimators budget.
+    # the results are cached on the training data, candidates and settings, so only the first run pays for the search
+    cache = ModelCache()
+    xgb_search = cached_successive_halving(
+        cache,
+        ## one thread per fit; the parallelism comes from the process pool
+        xgb.XGBRegressor(objective= 'reg:squarederror', n_jobs= 1),
+        grid({ 'learning_rate': [0.05, 0.1, 0.3], 'max_depth': [3, 5, 7], 'alpha': [0, 1, 10] }),
+        X_train, y_train, resource= 'n_estimators', min_resource= 10, max_resource= 270, seed= SEED
+    )
+    lm_search = cached_successive_halving(
+        cache,
+        LinearRegression(),
+        grid({ 'fit_intercept': [True, False], 'positive': [True, False] }),
+        X_train, y_train, seed= SEED
+    )
+    for name, search in [('LinearRegression', lm_search), ('XGBoost', xgb_search)]:
+        print('{} best cross-validated RMSE is {} with {}'.format(name, search.score, search.params))
+
+    ## 4. MODEL GENERATION
+
+    # create a LinearRegression and XGBoost model; store model information so we can fit them concurrently
+    models = {
+        'LinearRegression': LinearRegression(**lm_search.params),
+        'XGBoost': xgb.XGBRegressor(objective= 'reg:squarederror', **xgb_search.params)
+    }
+    results = train_models(models, X_train, y_train, splits, cache= cache)
+
+    ## 5. PREDICTION
+
+    # calculate root means squared error and r-squared from each model's cached predictions
+    metrics = {
+        'RMSE': lambda y_true, y_pred: np.sqrt(mean_squared_error(y_true, y_pred)),
+        'R2 score': r2_score
+    }
+    report(results, evaluate(results, splits, metrics))
+
+    # keep the fitted models around for model_server.py
+    save_models(results)
+
+if __name__ == '__main__':
+    main()
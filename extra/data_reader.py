@@ -1,117 +1,412 @@
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import csv
 from datetime import timezone, datetime
+import hashlib
+import io
+import json
 import logging
+import mmap
+import os
 import re
+import struct
+
+import eth_binary
 
 ## some globals
 dataset = 'Ethereum_Historical_Data.csv'
 
-## handle logger setup
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-## file handler
-fh = logging.FileHandler('data_reader.log', 'w')
-fh.setLevel(logging.DEBUG)
-logger.addHandler(fh)
-
-## stream handler
-sh = logging.StreamHandler()
-sh.setLevel(logging.INFO)
-logger.addHandler(sh)
+## handlers are attached in main(), not at import time: worker processes started with spawn re-import this module,
+## and a FileHandler opened there would truncate the parent's log
+logger = logging.getLogger(__name__)
 
 ## named tuples for easier attribute-accessing
 ETHRecord = namedtuple('ETHRecord', ['date', 'price', 'open', 'high', 'low', 'volume', 'perc_change'])
 
+## number of leading bytes fingerprinted to detect a rewritten (rather than appended) source
+FINGERPRINT_BYTES = 4096
+## target size of the chunks handed to worker processes when cleansing in parallel
+CHUNK_BYTES = 16 * 1024 * 1024
+
+def _cleanse_record(line):
+    """ Converts a raw Ethereum CSV row into a cleansed ETHRecord.
+
+    Arguments
+    ---------
+    line: list; required
+    A list of string fields as produced by csv.reader.
+    """
+
+    ## helper methods
+    def _convert_to_date(date):
+        """ Converts a formatted date (e.g. 'Mar 10, 2016') to an ISO-8601 date string.
+
+        Arguments
+        ---------
+        date: str; required
+        A string-representation of a date, formatted as '%b %d, %Y'.
+        """
+        return datetime.strptime(date.strip(), '%b %d, %Y').date().isoformat()
+
+    def _convert_to_volume(vol):
+        """ Converts an abbreviated number to a float. 
+        
+        Arguments
+        ---------
+        vol: str; required
+        A string-representation of a volume, denoted with a K or M for thousands and millions.
+        """
+        if vol.find('M') != -1:
+            ## split on 'K' convert to float and multiply by 1000000
+            return float(vol.split('M')[0].strip()) * 1000000
+        elif vol.find('K') != -1:
+            ## split on 'K' convert to float and multiply by 1000
+            return float(vol.split('K')[0].strip()) * 1000
+        elif vol.find('-') != -1:
+            ## null value found, return 0
+            return 0.00
+        else:
+            raise Exception(f'Found an unhandled character in volume: [{vol}]')
+
+    def _convert_to_true_percentage(perc):
+        """ Converts a formatted percentage to a float. 
+        
+        Arguments
+        ---------
+        perc: str; required
+        A string-representation of a percentage, denoted with %.
+        """
+        return float(perc.split('%')[0].strip()) / 100
+
+    def _convert_to_true_float(num):
+        """ Removes any extraneous characters from a formatted numeric. 
+        
+        Arguments
+        ---------
+        num: str; required
+        A string-representation of a volume, denoted with a K or M for thousands and millions.
+        """
+        return float(num.replace(',', ''))
+
+    return ETHRecord(
+        _convert_to_date(line[0]),
+        _convert_to_true_float(line[1]),
+        _convert_to_true_float(line[2]),
+        _convert_to_true_float(line[3]),
+        _convert_to_true_float(line[4]),
+        _convert_to_volume(line[5]),
+        _convert_to_true_percentage(line[6])
+    )
+
+def _last_record_boundary(data):
+    """ Returns the offset just past the last newline in data that is not inside a quoted field.
+
+    Arguments
+    ---------
+    data: bytes; required
+    Raw CSV bytes starting at a record boundary.
+    """
+    pos = data.rfind(b'\n')
+    while pos != -1:
+        ## an even number of quotes before the newline means we are outside of a quoted field
+        if data.count(b'"', 0, pos) % 2 == 0:
+            return pos + 1
+        pos = data.rfind(b'\n', 0, pos)
+    return 0
+
+def _split_records(path, start, stop, chunk_size):
+    """ Splits the byte range [start, stop) of a CSV file into roughly chunk_size pieces that begin and end on
+    record boundaries, so that no chunk starts inside a quoted field.
+
+    Arguments
+    ---------
+    path: str; required
+    The CSV file to split.
+
+    start: int; required
+    A byte offset that is known to be a record boundary.
+
+    stop: int; required
+    The byte offset to stop at.
+
+    chunk_size: int; required
+    The target chunk size in bytes.
+    """
+    bounds = [start]
+    with open(path, 'rb') as data, mmap.mmap(data.fileno(), 0, access= mmap.ACCESS_READ) as mm:
+        lo = start
+        while stop - lo > chunk_size:
+            cut = lo + chunk_size
+            quotes = mm[lo:cut].count(b'"')
+            ## walk forward to the first newline that sits outside of a quoted field
+            while True:
+                nl = mm.find(b'\n', cut, stop)
+                if nl == -1:
+                    cut = stop
+                    break
+                quotes += mm[cut:nl].count(b'"')
+                cut = nl + 1
+                if quotes % 2 == 0:
+                    break
+            if cut >= stop:
+                break
+            bounds.append(cut)
+            lo = cut
+    bounds.append(stop)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _cleanse_chunk(path, start, stop, header, final):
+    """ Cleanses the records in the byte range [start, stop) of a dataset. Runs in worker processes, so it only
+    touches its own slice of the file.
+
+    Returns the cleansed CSV bytes, the cleansed ETHRecords and the offset just past the last record consumed,
+    followed by the cleansed bytes and ETHRecords of a final row that has no newline yet. That row may still be
+    partway through being written, so it is never counted as consumed.
+
+    Arguments
+    ---------
+    path: str; required
+    The dataset to read.
+
+    start: int; required
+    A byte offset at a record boundary.
+
+    stop: int; required
+    A byte offset at a record boundary (or the end of the file).
+
+    header: bool; required
+    A boolean indicating whether the first record of the range is a header row.
+
+    final: bool; required
+    A boolean indicating whether the range runs to the end of the file, in which case a trailing record without a
+    newline is cleansed separately if it parses.
+    """
+    with open(path, 'rb') as data:
+        data.seek(start)
+        raw = data.read(stop - start)
+
+    ## only consume whole records; a trailing record without a newline is cleansed but left unconsumed
+    boundary = _last_record_boundary(raw) if final else len(raw)
+    encoding = 'utf-8-sig' if start == 0 else 'utf-8'
+    body = [(line, False) for line in csv.reader(io.StringIO(raw[:boundary].decode(encoding), newline= ''))]
+    tail = [(line, True) for line in csv.reader(io.StringIO(raw[boundary:].decode(encoding if boundary == 0 else 'utf-8'), newline= ''))]
+    end = start + boundary
+
+    records = []
+    clean_rows = []
+    trailing_records = []
+    for index, (line, trailing) in enumerate(body + tail):
+        if not line:
+            continue
+        ## skip line cleansing if header is present but write to output
+        if header and index == 0:
+            clean_rows.append(line)
+            logger.info(f'[{datetime.now(tz= timezone.utc)}] INFO Header row present; skipping')
+            continue
+        try:
+            record = _cleanse_record(line)
+        except (IndexError, ValueError) as e:
+            if not trailing:
+                raise
+            ## partially-appended row; leave it for the next run
+            logger.info(f'[{datetime.now(tz= timezone.utc)}] INFO Incomplete trailing row; deferring')
+            break
+        if trailing:
+            trailing_records.append(record)
+        else:
+            records.append(record)
+            clean_rows.append(record)
+
+    return _to_csv(clean_rows), records, end, _to_csv(trailing_records), trailing_records
+
+def _to_csv(rows):
+    """ Returns rows as CSV bytes in the cleansed output's format. """
+    out = io.StringIO()
+    csv.writer(out, lineterminator= '\n').writerows(rows)
+    return out.getvalue().encode('utf-8')
+
 class ETHPriceReader():
-    def __init__(self):
-        pass
+    def __init__(self, dataset= dataset):
+        self.dataset = dataset
+        self.clean_dataset = dataset + '.clean.csv'
+        self.binary_dataset = dataset + '.clean.bin'
+        self.checkpoint = dataset + '.checkpoint.json'
 
     def _data_streamer(self):
         pass
 
-    def _cleanse_data(self, header):
+    def _read_checkpoint(self):
+        """ Returns the saved checkpoint if it still describes an append-only prefix of the dataset, otherwise None.
+
+        A rewrite is detected when the source shrank below the checkpoint, or when the first or last FINGERPRINT_BYTES
+        before the checkpoint changed; _cleanse_data also rebuilds if the first appended row is not newer than the
+        last one. An in-place edit that only touches bytes between those two fingerprints is not detected, and the
+        stale rows are kept until the next full rebuild (incremental= False).
+        """
+        try:
+            with open(self.checkpoint, 'r') as cp_file:
+                cp = json.load(cp_file)
+            ## the cleaned output must still be (at least) as long as when we checkpointed it
+            if os.path.getsize(self.clean_dataset) < cp['clean_offset']:
+                return None
+            ## ...and so must the binary output
+            with open(self.binary_dataset, 'rb') as binary:
+                if eth_binary.read_header(binary).nrows < cp['rows']:
+                    return None
+            with open(self.dataset, 'rb') as data:
+                ## source shrank; it has been rewritten
+                if os.fstat(data.fileno()).st_size < cp['offset']:
+                    return None
+                ## leading bytes changed; it has been rewritten
+                head = data.read(min(FINGERPRINT_BYTES, cp['offset']))
+                if hashlib.sha256(head).hexdigest() != cp['head_sha256']:
+                    return None
+                ## bytes just before the checkpoint changed; it has been rewritten
+                data.seek(max(0, cp['offset'] - FINGERPRINT_BYTES))
+                tail = data.read(min(FINGERPRINT_BYTES, cp['offset']))
+                if hashlib.sha256(tail).hexdigest() != cp['tail_sha256']:
+                    return None
+            return cp
+        except (FileNotFoundError, KeyError, ValueError, struct.error) as e:
+            return None
+
+    def _write_checkpoint(self, offset, clean_offset, rows, last_date):
+        """ Atomically records how far into the dataset (and cleaned output) we have processed.
+
+        Arguments
+        ---------
+        offset: int; required
+        The byte offset in the dataset just past the last cleansed record.
+
+        clean_offset: int; required
+        The byte length of the cleaned output at that point.
+
+        rows: int; required
+        The number of cleansed records at that point.
+
+        last_date: str; required
+        The ISO-8601 date of the last cleansed record.
+        """
+        with open(self.dataset, 'rb') as data:
+            head = data.read(min(FINGERPRINT_BYTES, offset))
+            data.seek(max(0, offset - FINGERPRINT_BYTES))
+            tail = data.read(min(FINGERPRINT_BYTES, offset))
+        cp = {
+            'offset': offset,
+            'clean_offset': clean_offset,
+            'rows': rows,
+            'last_date': last_date,
+            'head_sha256': hashlib.sha256(head).hexdigest(),
+            'tail_sha256': hashlib.sha256(tail).hexdigest()
+        }
+        with open(self.checkpoint + '.tmp', 'w') as cp_file:
+            json.dump(cp, cp_file)
+        os.replace(self.checkpoint + '.tmp', self.checkpoint)
+
+    def _cleanse_data(self, header, incremental= True, workers= None, chunk_size= CHUNK_BYTES):
         """ Generic data-reading and cleansing method to be used on a dataset. 
+
+        When incremental is set, only the rows appended since the last checkpoint are cleansed and appended to the
+        cleaned output. A source that was rewritten rather than appended falls back to a full rebuild.
+
+        Ranges larger than chunk_size are split at record boundaries and cleansed in a process pool; the chunks are
+        written back in their original order, so the output is byte-identical to a single-process run.
         
         Arguments
         ---------
         header: bool; required
         A boolean indicating whether the data contains a header row.
-        """
 
-        ## helper methods
-        def _convert_to_volume(vol):
-            """ Converts an abbreviated number to a float. 
-            
-            Arguments
-            ---------
-            vol: str; required
-            A string-representation of a volume, denoted with a K or M for thousands and millions.
-            """
-            if vol.find('M') != -1:
-                ## split on 'K' convert to float and multiply by 1000000
-                return float(vol.split('M')[0].strip()) * 1000000
-            elif vol.find('K') != -1:
-                ## split on 'K' convert to float and multiply by 1000
-                return float(vol.split('K')[0].strip()) * 1000
-            elif vol.find('-') != -1:
-                ## null value found, return 0
-                return 0.00
-            else:
-                raise Exception(f'Found an unhandled character in volume: [{vol}]')
-
-        def _convert_to_true_percentage(perc):
-            """ Converts a formatted percentage to a float. 
-            
-            Arguments
-            ---------
-            perc: str; required
-            A string-representation of a percentage, denoted with %.
-            """
-            return float(perc.split('%')[0].strip()) / 100
-
-        def _convert_to_true_float(num):
-            """ Removes any extraneous characters from a formatted numeric. 
-            
-            Arguments
-            ---------
-            num: str; required
-            A string-representation of a volume, denoted with a K or M for thousands and millions.
-            """
-            return float(num.replace(',', ''))
+        incremental: bool; optional
+        A boolean indicating whether to resume from the last checkpoint.
+
+        workers: int; optional
+        The number of worker processes; defaults to the number of cores. 1 disables the pool.
+
+        chunk_size: int; optional
+        The target number of bytes per chunk handed to a worker.
+        """
+        cp = self._read_checkpoint() if incremental else None
+        if cp is None:
+            logger.info(f'[{datetime.now(tz= timezone.utc)}] INFO No usable checkpoint; rebuilding \"{self.clean_dataset}\"')
+            start, clean_offset, rows, last_date = 0, 0, 0, None
+        else:
+            start, clean_offset, rows, last_date = cp['offset'], cp['clean_offset'], cp['rows'], cp['last_date']
 
         ## read in dataset
         try:
-            with open(dataset, 'r') as data:
-                datareader = csv.reader(data, delimiter= ',', quotechar= '"')
-                with open(dataset + '.clean.csv', 'w') as clean_data:
-                    for index, line in enumerate(datareader):
-                        ## skip line cleansing if header is present but write to output
-                        if header and index == 0:
-                            clean_data.write(line[0])
-                            logger.error(f'[{datetime.now(tz= timezone.utc)}] INFO Header row present; skipping')
-                            continue
-                        else:
-                            ## cleanse line
-                            clean_data.writelines(
-                                datetime.strftime(line[0]),
-                                _convert_to_true_float(line[1]),
-                                _convert_to_true_float(line[2]),
-                                _convert_to_true_float(line[3]),
-                                _convert_to_true_float(line[4]),
-                                _convert_to_volume(line[5]),
-                                _convert_to_true_percentage(line[6])
-                            )
-
+            size = os.path.getsize(self.dataset)
         except FileNotFoundError as e:
-            logger.error(f'[{datetime.now(tz= timezone.utc)}] ERROR Could not find dataset \"{dataset}\"')
+            logger.error(f'[{datetime.now(tz= timezone.utc)}] ERROR Could not find dataset \"{self.dataset}\"')
+            return
+
+        workers = workers or os.cpu_count() or 1
+        chunks = _split_records(self.dataset, start, size, chunk_size) if workers > 1 and size - start > chunk_size else [(start, size)]
+        args = [
+            (self.dataset, lo, hi, header and lo == 0, hi == size)
+            for lo, hi in chunks
+        ]
+
+        pool = ProcessPoolExecutor(max_workers= min(workers, len(chunks))) if len(chunks) > 1 else None
+        try:
+            results = pool.map(_cleanse_chunk, *zip(*args)) if pool else (_cleanse_chunk(*arg) for arg in args)
+            end = start
+            new_rows = 0
+            with open(self.clean_dataset, 'wb' if start == 0 else 'r+b') as clean_data:
+                ## drop anything written after the checkpoint by an interrupted run
+                clean_data.seek(clean_offset)
+                clean_data.truncate()
+                for text, records, end, trailing_text, trailing in results:
+                    ## appended rows must be newer than what we have; otherwise the source was rewritten in place
+                    first = records or trailing
+                    if first and last_date is not None and new_rows == 0 and first[0].date <= last_date:
+                        logger.info(f'[{datetime.now(tz= timezone.utc)}] INFO Dataset was rewritten; rebuilding')
+                        break
+                    clean_data.write(text)
+                    ## mirror the rows into the memory-mappable binary output
+                    if start == 0 and new_rows == 0:
+                        eth_binary.write(self.binary_dataset, records)
+                    else:
+                        eth_binary.append(self.binary_dataset, records, at= rows + new_rows)
+                    new_rows += len(records)
+                    last_date = records[-1].date if records else last_date
+                else:
+                    clean_offset = clean_data.tell()
+                    self._write_checkpoint(end, clean_offset, rows + new_rows, last_date)
+                    ## a final row without its newline may be cut short, so it is written after the checkpoint; the
+                    ## next run truncates it and cleanses it again from the source
+                    if trailing:
+                        clean_data.write(trailing_text)
+                        eth_binary.append(self.binary_dataset, trailing, at= rows + new_rows)
+                        logger.info(f'[{datetime.now(tz= timezone.utc)}] INFO Trailing row has no newline; not checkpointed')
+                    logger.info(f'[{datetime.now(tz= timezone.utc)}] INFO Cleansed {new_rows + len(trailing)} new rows in {len(chunks)} chunks')
+                    return new_rows + len(trailing)
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures= True)
+        return self._cleanse_data(header, incremental= False, workers= workers, chunk_size= chunk_size)
 
 class ETHPriceSnapshot():
     def __init__(self):
         pass
 
+def _setup_logging():
+    """ Logs everything to data_reader.log and INFO and above to the console. """
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+
+    ## file handler
+    fh = logging.FileHandler('data_reader.log', 'w')
+    fh.setLevel(logging.DEBUG)
+    root.addHandler(fh)
+
+    ## stream handler
+    sh = logging.StreamHandler()
+    sh.setLevel(logging.INFO)
+    root.addHandler(sh)
+
 def main():
+    _setup_logging()
     ETHPriceReader()._cleanse_data(header= True)
 
 if __name__ == '__main__':
@@ -0,0 +1,219 @@
+""" Fixed-width, memory-mappable binary format for cleansed Ethereum price data.
+
+Layout (all values little-endian)
+---------------------------------
+Header, 64 bytes:
+    offset  size  field
+    0       4     magic, b'ETHB'
+    4       2     version (uint16), currently 1
+    6       2     column count (uint16), always len(COLUMNS)
+    8       8     row count (uint64); rows actually holding data
+    16      8     capacity (uint64); rows reserved per column
+    24      40    reserved, zero-filled
+
+Columns follow the header back to back, in COLUMNS order. Column i starts at byte 64 + i * capacity * 8 and holds
+capacity 8-byte slots, of which only the first row-count are meaningful:
+    date                                     int64, days since 1970-01-01 (numpy datetime64[D])
+    price, open, high, low, volume, change   float64
+
+Reserving capacity lets daily appends write into each column's slack and bump the row count instead of rewriting
+the file; the file is only rebuilt (with doubled capacity) once the slack runs out.
+"""
+from array import array
+from collections import namedtuple
+from datetime import date
+import mmap
+import os
+import struct
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'ETHB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQ40x')
+COLUMNS = ['date', 'price', 'open', 'high', 'low', 'volume', 'perc_change']
+TYPECODES = {'date': 'q', 'price': 'd', 'open': 'd', 'high': 'd', 'low': 'd', 'volume': 'd', 'perc_change': 'd'}
+DTYPES = {'date': '<M8[D]', 'price': '<f8', 'open': '<f8', 'high': '<f8', 'low': '<f8', 'volume': '<f8', 'perc_change': '<f8'}
+ITEMSIZE = 8
+MIN_CAPACITY = 1024
+
+Header = namedtuple('Header', ['version', 'ncols', 'nrows', 'capacity'])
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+def _to_days(iso_date):
+    """ Converts an ISO-8601 date string to days since the unix epoch. """
+    return date.fromisoformat(iso_date).toordinal() - EPOCH
+
+def _from_days(days):
+    """ Converts days since the unix epoch to an ISO-8601 date string. """
+    return date.fromordinal(days + EPOCH).isoformat()
+
+def _column_offset(index, capacity):
+    """ Returns the byte offset of the index-th column for a file with the given capacity. """
+    return HEADER.size + index * capacity * ITEMSIZE
+
+def _pack(values, typecode):
+    """ Packs a column of values into little-endian bytes. """
+    packed = array(typecode, values)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+def _columns_of(records):
+    """ Splits a list of ETHRecords (or plain tuples in COLUMNS order) into per-column lists. """
+    columns = dict(zip(COLUMNS, (list(values) for values in zip(*records)))) if records else {name: [] for name in COLUMNS}
+    columns['date'] = [_to_days(d) for d in columns['date']]
+    return columns
+
+def read_header(f):
+    """ Reads and validates the header of an open binary file.
+
+    Arguments
+    ---------
+    f: file; required
+    A binary file object positioned anywhere.
+    """
+    f.seek(0)
+    magic, version, ncols, nrows, capacity = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f'Not an ETH binary file (magic {magic!r})')
+    if version != VERSION or ncols != len(COLUMNS):
+        raise ValueError(f'Unsupported ETH binary file (version {version}, {ncols} columns)')
+    return Header(version, ncols, nrows, capacity)
+
+def write(path, records, capacity= None):
+    """ Writes records to a new binary file, replacing any existing one.
+
+    Arguments
+    ---------
+    path: str; required
+    The output file path.
+
+    records: list; required
+    A list of ETHRecord objects or tuples in COLUMNS order.
+
+    capacity: int; optional
+    Rows to reserve per column; defaults to double the row count.
+    """
+    capacity = max(capacity or 2 * len(records), len(records), MIN_CAPACITY)
+    columns = _columns_of(records)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), len(records), capacity))
+        for name in COLUMNS:
+            f.write(_pack(columns[name], TYPECODES[name]))
+            f.write(bytes((capacity - len(records)) * ITEMSIZE))
+    os.replace(path + '.tmp', path)
+
+def append(path, records, at= None):
+    """ Appends records to an existing binary file, growing it only when the reserved capacity runs out.
+
+    Arguments
+    ---------
+    path: str; required
+    The binary file path.
+
+    records: list; required
+    A list of ETHRecord objects or tuples in COLUMNS order.
+
+    at: int; optional
+    The row index to write from; rows at and beyond it are overwritten. Defaults to the current row count.
+    """
+    with open(path, 'r+b') as f:
+        header = read_header(f)
+        at = header.nrows if at is None else min(at, header.nrows)
+        nrows = at + len(records)
+        if nrows <= header.capacity:
+            columns = _columns_of(records)
+            for index, name in enumerate(COLUMNS):
+                f.seek(_column_offset(index, header.capacity) + at * ITEMSIZE)
+                f.write(_pack(columns[name], TYPECODES[name]))
+            ## only publish the new rows once their data is in place
+            f.flush()
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), nrows, header.capacity))
+            return
+    ## out of slack; rebuild with room to grow
+    with ETHBinaryReader(path) as reader:
+        existing = reader.records(stop= at)
+    write(path, existing + list(records), capacity= 2 * nrows)
+
+class ETHBinaryReader():
+    """ Memory-maps a binary file and exposes its columns as zero-copy views.
+
+    Views returned by column() borrow the mapping, so drop them before calling close().
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            header = read_header(self._file)
+        except ValueError:
+            self._file.close()
+            raise
+        self.nrows = header.nrows
+        self.capacity = header.capacity
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access= mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.nrows
+
+    def close(self):
+        """ Releases the mapping and the underlying file. """
+        self._mmap.close()
+        self._file.close()
+
+    def _view(self, name):
+        """ Returns a column as a typed memoryview over the mapping (a swapped copy on big-endian hosts). """
+        offset = _column_offset(COLUMNS.index(name), self.capacity)
+        view = memoryview(self._mmap)[offset:offset + self.nrows * ITEMSIZE]
+        if sys.byteorder != 'little':
+            ## cannot reinterpret in place on big-endian hosts; fall back to a swapped copy
+            values = array(TYPECODES[name], view.tobytes())
+            values.byteswap()
+            return memoryview(values)
+        return view.cast(TYPECODES[name])
+
+    def column(self, name):
+        """ Returns a zero-copy view of a column: a numpy array if numpy is installed, otherwise a memoryview.
+
+        Arguments
+        ---------
+        name: str; required
+        One of COLUMNS.
+        """
+        if np is not None:
+            offset = _column_offset(COLUMNS.index(name), self.capacity)
+            return np.frombuffer(self._mmap, dtype= DTYPES[name], count= self.nrows, offset= offset)
+        return self._view(name)
+
+    def records(self, start= 0, stop= None):
+        """ Materializes rows [start, stop) as tuples in COLUMNS order.
+
+        Arguments
+        ---------
+        start: int; optional
+        The first row to return.
+
+        stop: int; optional
+        One past the last row to return; defaults to the row count.
+        """
+        stop = self.nrows if stop is None else min(stop, self.nrows)
+        columns = [self._view(name) for name in COLUMNS]
+        rows = [
+            (_from_days(columns[0][i]),) + tuple(c[i] for c in columns[1:])
+            for i in range(start, stop)
+        ]
+        ## release the views so the mapping can be closed
+        for view in columns:
+            view.release()
+        return rows
@@ -1,51 +1,45 @@
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
-from sklearn.datasets import load_iris
+from local_datasets import load_iris
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
 import numpy as np
 
-## 1. IMPORT THE DATA
+from model_cache import ModelCache
+from model_harness import evaluate, report, save_models, train_models
 
-# unpack the dataset with return_X_y so that we only get the tuple (data, target) (i.e. predictors and responses)
-X, y = load_iris(return_X_y = True)
+## fixed split seed so that repeated runs train on identical data and can reuse cached models
+SEED = 3006
 
-## 2. SPLIT TEST/TRAIN
+def main():
+    ## 1. IMPORT THE DATA
 
-# split into testing and training data; returns numpy arrays
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = .3)
+    # load the bundled CSV as the tuple (data, target) (i.e. predictors and responses); cached as memory-mapped .npy
+    X, y = load_iris()
 
-## 3. MODEL GENERATION
+    ## 2. SPLIT TEST/TRAIN
 
-# create a LogisticRegression and SVM model and fit it against our data
-lrm = LogisticRegression().fit(X_train, y_train)
-svm = SVC(kernel= 'linear').fit(X_train, y_train)
-# store model information so we can loop quickly
-models = { 'LogisticRegression': lrm, 'SupportVectorMachines': svm }
+    # split into testing and training data; returns numpy arrays
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = .3, random_state = SEED)
+    splits = { 'training': (X_train, y_train), 'testing': (X_test, y_test) }
 
-## 4. PREDICTION
+    ## 3. MODEL GENERATION
 
-for name, model in models.items():
-    # predict responses using the linear model on the X_train set
-    y_train_predict = model.predict(X_train)
-    # calculate root means squared error
-    rmse = (np.sqrt(mean_squared_error(y_train, y_train_predict)))
-    # calculate r-squared
-    r2 = r2_score(y_train, y_train_predict)
+    # create a LogisticRegression and SVM model; store model information so we can fit them concurrently
+    models = { 'LogisticRegression': LogisticRegression(), 'SupportVectorMachines': SVC(kernel= 'linear') }
+    results = train_models(models, X_train, y_train, splits, cache= ModelCache())
 
-    print('{} model performance for training set'.format(name))
-    print('--------------------------------------')
-    print('RMSE is {}'.format(rmse))
-    print('R2 score is {}'.format(r2))
-    print('\n')
+    ## 4. PREDICTION
 
-    # model evaluation for testing set
-    y_test_predict = model.predict(X_test)
-    rmse = (np.sqrt(mean_squared_error(y_test, y_test_predict)))
-    r2 = r2_score(y_test, y_test_predict)
+    # calculate root means squared error and r-squared from each model's cached predictions
+    metrics = {
+        'RMSE': lambda y_true, y_pred: np.sqrt(mean_squared_error(y_true, y_pred)),
+        'R2 score': r2_score
+    }
+    report(results, evaluate(results, splits, metrics))
 
-    print('{} model performance for training set'.format(name))
-    print('--------------------------------------')
-    print('RMSE is {}'.format(rmse))
-    print('R2 score is {}'.format(r2))
-    print('\n')
\ No newline at end of file
+    # keep the fitted models around for model_server.py
+    save_models(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+""" Offline loaders for the CSV datasets that ship next to the sklearn scripts.
+
+The first load parses the CSV into .npy feature and target arrays beside it; later loads memory-map those arrays
+instead of re-parsing. The cache is rebuilt whenever the CSV is newer than it. Both loaders return (X, y) in the same
+shape as sklearn's load_*(return_X_y = True).
+"""
+import csv
+import os
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _save(path, array):
+    """ Atomically writes an array to a .npy file. """
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+def _load_csv(csv_path, parse):
+    """ Returns (X, y) for a CSV, parsing it only when its .npy cache is missing or stale.
+
+    Arguments
+    ---------
+    csv_path: str; required
+    The CSV file to load.
+
+    parse: callable; required
+    A function taking the csv.reader rows (header excluded) and returning (X, y) arrays.
+    """
+    stem = os.path.splitext(csv_path)[0]
+    X_path, y_path = stem + '.X.npy', stem + '.y.npy'
+    csv_mtime = os.path.getmtime(csv_path)
+    if not all(os.path.exists(p) and os.path.getmtime(p) >= csv_mtime for p in (X_path, y_path)):
+        with open(csv_path, 'r', newline= '') as data:
+            rows = csv.reader(data)
+            ## skip the header row
+            next(rows)
+            X, y = parse(rows)
+        _save(X_path, X)
+        _save(y_path, y)
+    return np.load(X_path, mmap_mode= 'r'), np.load(y_path, mmap_mode= 'r')
+
+def load_boston(path= os.path.join(HERE, 'bh.csv')):
+    """ Returns the Boston housing predictors (506 x 13) and median home values (medv).
+
+    Arguments
+    ---------
+    path: str; optional
+    The location of bh.csv.
+    """
+    def _parse(rows):
+        values = np.array([[float(v) for v in row] for row in rows])
+        return values[:, :-1], values[:, -1]
+    return _load_csv(path, _parse)
+
+def load_iris(path= os.path.join(HERE, 'iris.csv')):
+    """ Returns the iris measurements (150 x 4) and integer class labels (0 = Setosa, 1 = Versicolor, 2 = Virginica).
+
+    Arguments
+    ---------
+    path: str; optional
+    The location of iris.csv.
+    """
+    def _parse(rows):
+        rows = list(rows)
+        classes = sorted({row[-1] for row in rows})
+        X = np.array([[float(v) for v in row[:-1]] for row in rows])
+        y = np.array([classes.index(row[-1]) for row in rows])
+        return X, y
+    return _load_csv(path, _parse)
@@ -0,0 +1,156 @@
+""" Content-addressed, on-disk cache of fitted models.
+
+A model is keyed on a hash of its estimator class, its hyperparameters, the version of the library that provides it
+and the bytes of the training arrays, so a refit is only skipped when it would have produced the same model. Entries
+are pickles named after their key; hits refresh the file's modification time, which eviction uses as last access.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+## default eviction limits: 512 MB in total and 30 days since last use
+MAX_BYTES = 512 * 1024 * 1024
+MAX_AGE = 30 * 24 * 60 * 60
+
+class ModelCache():
+    def __init__(self, directory= '.model_cache', max_bytes= MAX_BYTES, max_age= MAX_AGE):
+        """ Creates a cache rooted at directory.
+
+        Arguments
+        ---------
+        directory: str; optional
+        The directory fitted models are stored in; created if missing.
+
+        max_bytes: int; optional
+        The total size the cache is trimmed to after every store, evicting least recently used entries first.
+
+        max_age: int; optional
+        Entries unused for more than this many seconds are evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok= True)
+
+    def key(self, model, X, y):
+        """ Returns the hex digest identifying model fitted on (X, y).
+
+        Arguments
+        ---------
+        model: estimator; required
+        An unfitted sklearn-compatible estimator.
+
+        X, y: array; required
+        The training predictors and responses.
+        """
+        cls = type(model)
+        package = sys.modules.get(cls.__module__.split('.')[0])
+        digest = hashlib.sha256()
+        digest.update(f'{cls.__module__}.{cls.__qualname__}'.encode())
+        digest.update(str(getattr(package, '__version__', '')).encode())
+        digest.update(repr(sorted(model.get_params(deep= True).items())).encode())
+        for array in (X, y):
+            array = np.ascontiguousarray(array)
+            digest.update(f'{array.dtype.str}{array.shape}'.encode())
+            digest.update(memoryview(array).cast('B'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        """ Returns the file a key is stored in. """
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        """ Returns the fitted model stored under key, or None on a miss. An entry that can no longer be unpickled,
+        e.g. because it refers to a class a newer library version renamed or removed, is a miss too, so the model is
+        refitted and the entry replaced.
+
+        Arguments
+        ---------
+        key: str; required
+        A key produced by key().
+        """
+        try:
+            with open(self._path(key), 'rb') as f:
+                model = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError,
+                TypeError, ValueError) as e:
+            return None
+        ## mark as recently used
+        os.utime(self._path(key))
+        return model
+
+    def put(self, key, model):
+        """ Stores a fitted model under key, then evicts entries over the size and age limits.
+
+        Arguments
+        ---------
+        key: str; required
+        A key produced by key().
+
+        model: estimator; required
+        The fitted estimator.
+        """
+        tmp = f'{self._path(key)}.{os.getpid()}.tmp'
+        ## write to a private file and rename it into place, so readers never see a partial entry
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(model, f, protocol= pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def fit(self, model, X, y):
+        """ Returns (model fitted on (X, y), True if it was loaded from the cache).
+
+        Arguments
+        ---------
+        model: estimator; required
+        An unfitted sklearn-compatible estimator.
+
+        X, y: array; required
+        The training predictors and responses.
+        """
+        key = self.key(model, X, y)
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+        model.fit(X, y)
+        self.put(key, model)
+        return model, False
+
+    def evict(self):
+        """ Removes entries unused for longer than max_age, then least recently used entries until the cache fits in
+        max_bytes. """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError as e:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        """ Deletes a cache entry, tolerating one that is already gone. """
+        try:
+            os.remove(path)
+        except FileNotFoundError as e:
+            ## another process got there first
+            pass
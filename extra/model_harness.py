@@ -0,0 +1,139 @@
+""" Shared training and evaluation harness for the sklearn scripts.
+
+Models are fitted concurrently in a process pool, each split is predicted exactly once per model, and every metric is
+computed from those cached predictions.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+import pickle
+import time
+
+## fitted model, its predictions for each split, how long each step took (in seconds) and whether the fit was cached
+ModelResult = namedtuple('ModelResult', ['name', 'model', 'predictions', 'fit_time', 'predict_times', 'cached'])
+
+def _fit_and_predict(name, model, X_train, y_train, splits, cache= None):
+    """ Fits a model and predicts every split once. Runs in worker processes.
+
+    Arguments
+    ---------
+    name: str; required
+    The display name of the model.
+
+    model: estimator; required
+    An unfitted sklearn-compatible estimator.
+
+    X_train, y_train: array; required
+    The training predictors and responses.
+
+    splits: dict; required
+    A dictionary of split name to (X, y) tuples to predict.
+
+    cache: ModelCache; optional
+    A model cache to load the fitted model from, or store it in.
+    """
+    start = time.perf_counter()
+    if cache is None:
+        model, cached = model.fit(X_train, y_train), False
+    else:
+        model, cached = cache.fit(model, X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    predictions = {}
+    predict_times = {}
+    for split, (X, _) in splits.items():
+        start = time.perf_counter()
+        predictions[split] = model.predict(X)
+        predict_times[split] = time.perf_counter() - start
+    return ModelResult(name, model, predictions, fit_time, predict_times, cached)
+
+def train_models(models, X_train, y_train, splits, workers= None, cache= None):
+    """ Fits every model concurrently and predicts each split once per model.
+
+    Returns a dictionary of model name to ModelResult, in the same order as models.
+
+    Arguments
+    ---------
+    models: dict; required
+    A dictionary of display name to unfitted estimator.
+
+    X_train, y_train: array; required
+    The training predictors and responses.
+
+    splits: dict; required
+    A dictionary of split name to (X, y) tuples to predict, e.g. {'training': (X_train, y_train)}.
+
+    workers: int; optional
+    The number of worker processes; defaults to one per model, capped at the number of cores. 1 disables the pool.
+
+    cache: ModelCache; optional
+    A model cache; models already fitted on the same data and hyperparameters are loaded instead of refitted.
+    """
+    workers = workers or min(len(models), os.cpu_count() or 1)
+    if workers <= 1:
+        results = [_fit_and_predict(name, model, X_train, y_train, splits, cache) for name, model in models.items()]
+    else:
+        with ProcessPoolExecutor(max_workers= workers) as pool:
+            futures = [pool.submit(_fit_and_predict, name, model, X_train, y_train, splits, cache) for name, model in models.items()]
+            results = [future.result() for future in futures]
+    return { result.name: result for result in results }
+
+def evaluate(results, splits, metrics):
+    """ Computes every metric for every model and split from the cached predictions.
+
+    Returns a nested dictionary of model name -> split name -> metric name -> score.
+
+    Arguments
+    ---------
+    results: dict; required
+    The output of train_models().
+
+    splits: dict; required
+    The same split dictionary that was passed to train_models().
+
+    metrics: dict; required
+    A dictionary of metric name to a callable taking (y_true, y_pred).
+    """
+    return {
+        name: {
+            split: { metric: score(y, result.predictions[split]) for metric, score in metrics.items() }
+            for split, (_, y) in splits.items()
+        }
+        for name, result in results.items()
+    }
+
+def report(results, scores):
+    """ Prints the scores and timings for each model and split.
+
+    Arguments
+    ---------
+    results: dict; required
+    The output of train_models().
+
+    scores: dict; required
+    The output of evaluate().
+    """
+    for name, result in results.items():
+        print('{} {} in {:.4f}s'.format(name, 'loaded from cache' if result.cached else 'fit', result.fit_time))
+        for split, split_scores in scores[name].items():
+            print('{} model performance for {} set (predicted in {:.4f}s)'.format(name, split, result.predict_times[split]))
+            print('--------------------------------------')
+            for metric, score in split_scores.items():
+                print('{} is {}'.format(metric, score))
+            print('\n')
+
+def save_models(results, directory= 'models'):
+    """ Pickles each fitted model to <directory>/<name>.pkl, e.g. for model_server.py to load.
+
+    Arguments
+    ---------
+    results: dict; required
+    The output of train_models().
+
+    directory: str; optional
+    The directory to write the models to; created if missing.
+    """
+    os.makedirs(directory, exist_ok= True)
+    for name, result in results.items():
+        with open(os.path.join(directory, name + '.pkl'), 'wb') as f:
+            pickle.dump(result.model, f, protocol= pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,232 @@
+""" Parallel hyperparameter search with k-fold cross-validation and successive halving.
+
+Every (candidate, fold) fit is an independent task in a process pool; the training arrays are shipped to each worker
+once through the pool initializer rather than with every task. Candidates are raced with successive halving: each
+round fits the survivors with a larger budget of a resource parameter (e.g. n_estimators) and keeps the best 1/eta.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import os
+import random
+import time
+
+import numpy as np
+from sklearn.base import clone
+from local_datasets import load_boston
+from sklearn.metrics import mean_squared_error
+import xgboost as xgb
+
+## best candidate, its mean cross-validated score and one (round, budget, params, score) row per evaluation
+SearchResult = namedtuple('SearchResult', ['params', 'score', 'history'])
+
+## training arrays for the current worker process, set once by _init_worker
+_X = None
+_y = None
+
+def rmse(y_true, y_pred):
+    """ Root mean squared error; the default search score (lower is better). """
+    return np.sqrt(mean_squared_error(y_true, y_pred))
+
+def grid(param_grid):
+    """ Returns every combination of a parameter grid as a list of dictionaries.
+
+    Arguments
+    ---------
+    param_grid: dict; required
+    A dictionary of parameter name to a list of values to try.
+    """
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+def random_candidates(param_distributions, n, seed= None):
+    """ Returns n random parameter dictionaries.
+
+    Arguments
+    ---------
+    param_distributions: dict; required
+    A dictionary of parameter name to either a list of values to choose from or a callable taking a random.Random.
+
+    n: int; required
+    The number of candidates to draw.
+
+    seed: int; optional
+    A seed for reproducible draws.
+    """
+    rng = random.Random(seed)
+    return [
+        { name: dist(rng) if callable(dist) else rng.choice(dist) for name, dist in param_distributions.items() }
+        for _ in range(n)
+    ]
+
+def kfold(n, k= 5, seed= None):
+    """ Returns k (train indices, test indices) pairs over n shuffled rows.
+
+    Arguments
+    ---------
+    n: int; required
+    The number of rows.
+
+    k: int; optional
+    The number of folds.
+
+    seed: int; optional
+    A seed for the shuffle.
+    """
+    folds = np.array_split(np.random.RandomState(seed).permutation(n), k)
+    return [(np.concatenate(folds[:i] + folds[i + 1:]), folds[i]) for i in range(k)]
+
+def _init_worker(X, y):
+    """ Stores the training arrays in a worker process. """
+    global _X, _y
+    _X, _y = X, y
+
+def _score_fold(estimator, params, train, test, score):
+    """ Fits a clone of estimator with params on one fold and scores it on the held-out rows. Runs in worker processes.
+
+    Arguments
+    ---------
+    estimator: estimator; required
+    The base estimator.
+
+    params: dict; required
+    The parameters to set on the clone.
+
+    train, test: array; required
+    Row indices of the fold.
+
+    score: callable; required
+    A function taking (y_true, y_pred); lower is better.
+    """
+    model = clone(estimator).set_params(**params)
+    model.fit(_X[train], _y[train])
+    return score(_y[test], model.predict(_X[test]))
+
+def successive_halving(estimator, candidates, X, y, k= 5, resource= None, min_resource= 10, max_resource= 270, eta= 3,
+                       score= rmse, workers= None, seed= None):
+    """ Races candidates with k-fold cross-validation, cutting all but the best 1/eta after each round.
+
+    Without a resource every candidate is cross-validated once at full cost (a plain grid/random search).
+
+    Arguments
+    ---------
+    estimator: estimator; required
+    The base estimator; each candidate's parameters are set on a clone.
+
+    candidates: list; required
+    A list of parameter dictionaries, e.g. from grid() or random_candidates().
+
+    X, y: array; required
+    The training predictors and responses.
+
+    k: int; optional
+    The number of cross-validation folds.
+
+    resource: str; optional
+    A parameter that scales the fitting budget (e.g. 'n_estimators'), grown by eta each round.
+
+    min_resource, max_resource: int; optional
+    The budget of the first round and the cap for the last.
+
+    eta: int; optional
+    The factor by which survivors are cut and the budget grown each round.
+
+    score: callable; optional
+    A function taking (y_true, y_pred); lower is better.
+
+    workers: int; optional
+    The number of worker processes; defaults to the number of cores.
+
+    seed: int; optional
+    A seed for the fold shuffle.
+    """
+    X, y = np.asarray(X), np.asarray(y)
+    folds = kfold(len(y), k, seed)
+    survivors = list(candidates)
+    budget = min_resource if resource else None
+    history = []
+    with ProcessPoolExecutor(max_workers= workers or os.cpu_count(), initializer= _init_worker, initargs= (X, y)) as pool:
+        for round_number in itertools.count():
+            params = [dict(p, **{resource: budget}) if resource else p for p in survivors]
+            ## fan out every (candidate, fold) pair, then average each candidate's folds
+            futures = [[pool.submit(_score_fold, estimator, p, train, test, score) for train, test in folds] for p in params]
+            scores = [float(np.mean([future.result() for future in fold_futures])) for fold_futures in futures]
+            history.extend((round_number, budget, p, s) for p, s in zip(params, scores))
+
+            ranked = sorted(zip(scores, range(len(params))))
+            if not resource or len(survivors) == 1 or budget >= max_resource:
+                best_score, best = ranked[0]
+                return SearchResult(params[best], best_score, history)
+            survivors = [survivors[i] for _, i in ranked[:max(1, len(survivors) // eta)]]
+            budget = min(budget * eta, max_resource)
+
+def cached_successive_halving(cache, estimator, candidates, X, y, **kwargs):
+    """ Returns successive_halving() for these arguments from cache, running the search only on a miss.
+
+    The key covers everything that changes the outcome: the estimator and its parameters, the library version, the
+    training arrays (as in ModelCache.key), the candidates and the search settings; workers is left out.
+
+    Arguments
+    ---------
+    cache: ModelCache; required
+    The cache to store the SearchResult in.
+
+    estimator, candidates, X, y: required
+    As for successive_halving().
+
+    kwargs: optional
+    Any other successive_halving() arguments.
+    """
+    settings = sorted((name, getattr(value, '__qualname__', value)) for name, value in kwargs.items() if name != 'workers')
+    digest = hashlib.sha256(cache.key(estimator, X, y).encode())
+    digest.update(repr(('successive_halving', candidates, settings)).encode())
+    key = digest.hexdigest()
+    result = cache.get(key)
+    if result is None:
+        result = successive_halving(estimator, candidates, X, y, **kwargs)
+        cache.put(key, result)
+    return result
+
+def scaling_curve(estimator, candidates, X, y, worker_counts= None, **kwargs):
+    """ Times the same search at several worker counts.
+
+    Returns a list of (workers, seconds, fits per second) tuples.
+
+    Arguments
+    ---------
+    estimator, candidates, X, y: required
+    As for successive_halving().
+
+    worker_counts: list; optional
+    The worker counts to time; defaults to powers of two up to the number of cores.
+
+    kwargs: optional
+    Any other successive_halving() arguments.
+    """
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores} | {cores})
+    curve = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        result = successive_halving(estimator, candidates, X, y, workers= workers, **kwargs)
+        seconds = time.perf_counter() - start
+        fits = len(result.history) * kwargs.get('k', 5)
+        curve.append((workers, seconds, fits / seconds))
+    return curve
+
+def main():
+    ## report how XGBoost search throughput scales with the number of workers on the Boston housing data
+    X, y = load_boston()
+    curve = scaling_curve(
+        ## one thread per fit; the parallelism comes from the process pool
+        xgb.XGBRegressor(objective= 'reg:squarederror', n_jobs= 1),
+        grid({ 'learning_rate': [0.05, 0.1, 0.3], 'max_depth': [3, 5, 7], 'alpha': [0, 1, 10] }),
+        X, y, resource= 'n_estimators', min_resource= 10, max_resource= 270, seed= 0
+    )
+    print('workers, seconds, fits/second, speedup')
+    for workers, seconds, throughput in curve:
+        print('{}, {:.2f}, {:.1f}, {:.2f}x'.format(workers, seconds, throughput, throughput / curve[0][2]))
+
+if __name__ == '__main__':
+    main()
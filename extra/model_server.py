@@ -0,0 +1,269 @@
+""" Local micro-batching inference server for the trained sklearn/XGBoost models, plus a load generator.
+
+Concurrent single-row requests are queued per model; a batching thread drains the queue into one batch, waiting at
+most max_delay seconds after the first row (or until max_batch rows arrive), and makes a single model.predict call for
+the whole batch.
+
+    python model_server.py serve --model XGBoost=models/XGBoost.pkl --port 8000
+    python model_server.py bench --url http://127.0.0.1:8000 --name XGBoost --features 0.1,18,2.3,0,0.5,6.5,65,4,1,296,15,396,5
+"""
+import argparse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import pickle
+import queue
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+def percentile(values, q):
+    """ Returns the q-th percentile (0-100) of values by nearest rank, or None when empty. """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+class MicroBatcher():
+    def __init__(self, model, max_batch= 64, max_delay= 0.005, window= 10000):
+        """ Starts a daemon thread that serves predictions for model in micro-batches.
+
+        Arguments
+        ---------
+        model: estimator; required
+        A fitted estimator with a predict() method.
+
+        max_batch: int; optional
+        The largest number of rows passed to a single predict() call.
+
+        max_delay: float; optional
+        The longest time, in seconds, the first row of a batch waits for more rows to arrive.
+
+        window: int; optional
+        The number of recent latencies kept for the percentile statistics.
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.latencies = deque(maxlen= window)
+        self.batch_sizes = deque(maxlen= window)
+        self.completed = 0
+        self.started = time.perf_counter()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        threading.Thread(target= self._run, daemon= True).start()
+
+    def submit(self, row):
+        """ Queues one feature row and returns a Future that resolves to its prediction.
+
+        Arguments
+        ---------
+        row: list; required
+        The feature values for a single observation.
+        """
+        ## reject malformed rows here, so they never reach (and fail) a batch shared with other requests
+        row = np.asarray(row, dtype= float)
+        expected = getattr(self.model, 'n_features_in_', None)
+        if row.ndim != 1 or (expected is not None and len(row) != expected):
+            raise ValueError(f'expected a flat row of {expected or "n"} features, got shape {row.shape}')
+        future = Future()
+        self._queue.put((time.perf_counter(), row, future))
+        return future
+
+    def predict(self, row):
+        """ Blocks until the prediction for a single feature row is available. """
+        return self.submit(row).result()
+
+    def _run(self):
+        """ Collects queued rows into batches and predicts each batch in one call. """
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0][0] + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout= timeout))
+                except queue.Empty:
+                    break
+            try:
+                predictions = self.model.predict(np.stack([row for _, row, _ in batch]))
+            except Exception as e:
+                ## one bad row must not fail the others: retry the batch row by row
+                predictions = []
+                for _, row, future in batch:
+                    try:
+                        predictions.append(self.model.predict(row[np.newaxis])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+                        predictions.append(None)
+            done = time.perf_counter()
+            for (enqueued, _, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction.item() if hasattr(prediction, 'item') else prediction)
+            with self._lock:
+                self.latencies.extend(done - enqueued for enqueued, _, _ in batch)
+                self.batch_sizes.append(len(batch))
+                self.completed += len(batch)
+
+    def stats(self):
+        """ Returns p50/p99 latency (ms), mean batch size and throughput (predictions/second) since start. """
+        with self._lock:
+            latencies = list(self.latencies)
+            batch_sizes = list(self.batch_sizes)
+            completed = self.completed
+        return {
+            'completed': completed,
+            'p50_ms': None if not latencies else percentile(latencies, 50) * 1000,
+            'p99_ms': None if not latencies else percentile(latencies, 99) * 1000,
+            'mean_batch': None if not batch_sizes else sum(batch_sizes) / len(batch_sizes),
+            'throughput': completed / (time.perf_counter() - self.started)
+        }
+
+class _Server(ThreadingHTTPServer):
+    ## the default listen backlog of 5 drops connections under concurrent load, which shows up as 1s+ tail latency
+    request_queue_size = 128
+    daemon_threads = True
+
+def make_handler(batchers):
+    """ Returns a request handler class serving the given batchers.
+
+        POST /predict/<name>  {"features": [...]}  ->  {"prediction": ...}
+        GET  /stats                                ->  {"<name>": {...}, ...}
+
+    Arguments
+    ---------
+    batchers: dict; required
+    A dictionary of model name to MicroBatcher.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, { name: batcher.stats() for name, batcher in batchers.items() })
+            else:
+                self._reply(404, { 'error': f'unknown path {self.path}' })
+
+        def do_POST(self):
+            name = self.path[len('/predict/'):] if self.path.startswith('/predict/') else None
+            if name not in batchers:
+                self._reply(404, { 'error': f'unknown model {name}' })
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self._reply(200, { 'prediction': batchers[name].predict(request['features']) })
+            except Exception as e:
+                self._reply(400, { 'error': str(e) })
+
+        def log_message(self, format, *args):
+            ## per-request logging would dominate the latency we are measuring
+            pass
+
+    return Handler
+
+def serve(models, host= '127.0.0.1', port= 8000, max_batch= 64, max_delay= 0.005):
+    """ Loads each pickled model once and serves predictions until interrupted.
+
+    Arguments
+    ---------
+    models: dict; required
+    A dictionary of model name to the path of a pickled, fitted estimator.
+
+    host, port: optional
+    The address to listen on.
+
+    max_batch, max_delay: optional
+    As for MicroBatcher.
+    """
+    batchers = {}
+    for name, path in models.items():
+        with open(path, 'rb') as f:
+            batchers[name] = MicroBatcher(pickle.load(f), max_batch= max_batch, max_delay= max_delay)
+    server = _Server((host, port), make_handler(batchers))
+    print(f'Serving {", ".join(batchers)} on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def bench(url, name, features, requests= 2000, concurrency= 32):
+    """ Fires single-row requests at a running server from concurrent clients.
+
+    Returns client-side p50/p99 latency (ms) and throughput (requests/second), plus the server's own statistics.
+
+    Arguments
+    ---------
+    url: str; required
+    The server base URL, e.g. http://127.0.0.1:8000.
+
+    name: str; required
+    The model to query.
+
+    features: list; required
+    The feature row sent with every request.
+
+    requests: int; optional
+    The total number of requests.
+
+    concurrency: int; optional
+    The number of concurrent clients.
+    """
+    body = json.dumps({ 'features': features }).encode()
+
+    def _one(_):
+        start = time.perf_counter()
+        request = urllib.request.Request(f'{url}/predict/{name}', data= body, headers= { 'Content-Type': 'application/json' })
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers= concurrency) as pool:
+        latencies = list(pool.map(_one, range(requests)))
+    elapsed = time.perf_counter() - start
+    with urllib.request.urlopen(f'{url}/stats') as response:
+        server_stats = json.loads(response.read())
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'throughput': requests / elapsed,
+        'server': server_stats.get(name)
+    }
+
+def main():
+    ## handle argparse setup
+    parser = argparse.ArgumentParser(description= 'Serve or load-test the trained models')
+    parser.add_argument('command', metavar= '<command>', choices= ['serve', 'bench'], help= 'serve or bench', type= str)
+    parser.add_argument('--model', metavar= '<name=path>', action= 'append', default= [], dest= 'models', help= 'a pickled model to serve')
+    parser.add_argument('--host', metavar= '<host>', type= str, default= '127.0.0.1')
+    parser.add_argument('--port', metavar= '<port>', type= int, default= 8000)
+    parser.add_argument('--max-batch', metavar= '<rows>', type= int, default= 64, dest= 'max_batch')
+    parser.add_argument('--max-delay', metavar= '<seconds>', type= float, default= 0.005, dest= 'max_delay')
+    parser.add_argument('--url', metavar= '<url>', type= str, default= 'http://127.0.0.1:8000')
+    parser.add_argument('--name', metavar= '<model name>', type= str)
+    parser.add_argument('--features', metavar= '<f1,f2,...>', type= str)
+    parser.add_argument('--requests', metavar= '<count>', type= int, default= 2000)
+    parser.add_argument('--concurrency', metavar= '<clients>', type= int, default= 32)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(dict(model.split('=', 1) for model in args.models), args.host, args.port, args.max_batch, args.max_delay)
+    else:
+        features = [float(f) for f in args.features.split(',')]
+        print(json.dumps(bench(args.url, args.name, features, args.requests, args.concurrency), indent= 2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Unit tests for the data_reader module."""
+from datetime import date, timedelta
+import logging
+from operator import itemgetter
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_reader
+from data_reader import *
+import eth_binary
+
+HEADER = '﻿"Date","Price","Open","High","Low","Vol.","Change %"\n'
+
+def row(day, price= '1,234.50', split_date= False):
+    """Returns one raw CSV row, day days after the first trading day; split_date puts a newline inside the quoted
+    date field."""
+    when = date(2016, 3, 10) + timedelta(days= day)
+    when = f'{when:%b %d,}\n{when:%Y}' if split_date else f'{when:%b %d, %Y}'
+    return f'"{when}","{price}","1,200.00","1,250.00","1,190.00","2.20M","1.76%"\n'
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dataset = os.path.join(self.tmp, 'eth.csv')
+        self.write(HEADER + ''.join(row(day) for day in range(200)))
+        self.reader = ETHPriceReader(self.dataset)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, text, mode= 'w'):
+        with open(self.dataset, mode, encoding= 'utf-8', newline= '') as f:
+            f.write(text)
+
+    def cleansed(self, reader):
+        with open(reader.clean_dataset, 'rb') as f:
+            text = f.read()
+        with eth_binary.ETHBinaryReader(reader.binary_dataset) as binary:
+            return text, list(binary.records())
+
+    def rebuilt(self):
+        """Returns what a full rebuild of the current dataset produces, without touching the reader under test."""
+        copy = os.path.join(self.tmp, 'copy.csv')
+        shutil.copyfile(self.dataset, copy)
+        reader = ETHPriceReader(copy)
+        reader._cleanse_data(header= True, incremental= False, workers= 1)
+        return self.cleansed(reader)
+
+    def test_first_run(self):
+        self.assertEqual(200, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(200, self.reader._read_checkpoint()['rows'])
+        # nothing new, nothing to do
+        self.assertEqual(0, self.reader._cleanse_data(header= True, workers= 1))
+
+    def test_append_resumes(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        self.write(''.join(row(day) for day in range(200, 230)), 'a')
+        self.assertEqual(30, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_shrunk_source_rebuilds(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        self.write(HEADER + ''.join(row(day) for day in range(150)))
+        self.assertIsNone(self.reader._read_checkpoint())
+        self.assertEqual(150, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_changed_head_rebuilds(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        # same length, different first row
+        self.write(HEADER + row(0, '9,999.99') + ''.join(row(day) for day in range(1, 200)))
+        self.assertIsNone(self.reader._read_checkpoint())
+        self.assertEqual(200, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_changed_tail_rebuilds(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        self.write(HEADER + ''.join(row(day) for day in range(199)) + row(199, '9,999.99'))
+        self.assertIsNone(self.reader._read_checkpoint())
+        self.assertEqual(200, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_unchanged_middle_is_not_detected(self):
+        # the documented gap: only the first and last FINGERPRINT_BYTES before the checkpoint are compared
+        self.reader._cleanse_data(header= True, workers= 1)
+        self.write(HEADER + ''.join(row(day, '9,999.99' if day == 100 else '1,234.50') for day in range(200)))
+        self.assertIsNotNone(self.reader._read_checkpoint())
+
+    def test_older_date_rebuilds(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        # an appended row that is not newer than the last one means the source was rewritten
+        self.write(row(50) + row(300), 'a')
+        self.assertEqual(202, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_partial_trailing_row_deferred(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        offset = self.reader._read_checkpoint()['offset']
+        partial = row(200)[:20]
+        self.write(partial, 'a')
+        self.assertEqual(0, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(offset, self.reader._read_checkpoint()['offset'])
+        # once the rest of the row arrives it is picked up
+        self.write(row(200)[20:], 'a')
+        self.assertEqual(1, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_complete_trailing_row_without_newline(self):
+        self.reader._cleanse_data(header= True, workers= 1)
+        offset = self.reader._read_checkpoint()['offset']
+        self.write(row(200).rstrip('\n'), 'a')
+        # the row is cleansed, but not checkpointed until its newline arrives
+        self.assertEqual(1, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual((200, offset), itemgetter('rows', 'offset')(self.reader._read_checkpoint()))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+        # rerunning replaces it rather than duplicating it
+        self.assertEqual(1, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+        self.write('\n', 'a')
+        self.assertEqual(1, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(201, self.reader._read_checkpoint()['rows'])
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+
+    def test_truncated_last_field(self):
+        # the writer is caught partway through the last quoted field, which still parses (as the wrong value)
+        self.reader._cleanse_data(header= True, workers= 1)
+        cut = row(200).index('1.76%') + 3
+        self.write(row(200)[:cut], 'a')
+        self.assertEqual(1, self.reader._cleanse_data(header= True, workers= 1))
+        # the rest of the row and later rows arrive; all of them are picked up with the right values
+        self.write(row(200)[cut:] + ''.join(row(day) for day in range(201, 204)), 'a')
+        self.assertEqual(4, self.reader._cleanse_data(header= True, workers= 1))
+        self.assertEqual(204, self.reader._read_checkpoint()['rows'])
+        self.assertEqual(self.rebuilt(), self.cleansed(self.reader))
+        with eth_binary.ETHBinaryReader(self.reader.binary_dataset) as binary:
+            self.assertEqual(0.0176, binary.records(200, 201)[0][-1])
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        ## every seventh date has a newline inside its quoted field
+        self.text = HEADER + ''.join(row(day, split_date= day % 7 == 0) for day in range(600))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def cleanse(self, name, **kwargs):
+        dataset = os.path.join(self.tmp, name)
+        with open(dataset, 'w', encoding= 'utf-8', newline= '') as f:
+            f.write(self.text)
+        reader = ETHPriceReader(dataset)
+        rows = reader._cleanse_data(header= True, incremental= False, **kwargs)
+        with open(reader.clean_dataset, 'rb') as f:
+            clean = f.read()
+        ## the binary file's reserved capacity depends on how it was appended to, so compare its rows
+        with eth_binary.ETHBinaryReader(reader.binary_dataset) as f:
+            binary = list(f.records())
+        with open(reader.checkpoint) as f:
+            checkpoint = json.load(f)
+        return rows, clean, binary, checkpoint
+
+    def test_matches_sequential(self):
+        chunk_size = 500
+        sequential = self.cleanse('sequential.csv', workers= 1, chunk_size= chunk_size)
+        dataset = os.path.join(self.tmp, 'sequential.csv')
+        with open(dataset, 'rb') as f:
+            raw = f.read()
+        # naive cuts every chunk_size bytes would land inside quoted fields...
+        self.assertTrue(any(raw[:cut].count(b'"') % 2 for cut in range(chunk_size, len(raw), chunk_size)))
+        # ...but the real chunk boundaries never do
+        chunks = data_reader._split_records(dataset, 0, len(raw), chunk_size)
+        self.assertGreater(len(chunks), 50)
+        for _, stop in chunks:
+            self.assertEqual(0, raw[:stop].count(b'"') % 2)
+        for workers in (2, 4):
+            self.assertEqual(sequential, self.cleanse(f'parallel{workers}.csv', workers= workers, chunk_size= chunk_size))
+        self.assertEqual(600, sequential[0])
+
+    def test_import_adds_no_handlers(self):
+        # spawned workers re-import the module; that must not open (and truncate) the log again
+        self.assertEqual([], logging.getLogger('data_reader').handlers)
+
+if __name__ == '__main__':
+    unittest.main()
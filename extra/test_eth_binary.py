@@ -0,0 +1,100 @@
+"""Unit tests for the eth_binary module."""
+from datetime import date, timedelta
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from eth_binary import *
+
+def records(start, count):
+    """Returns count consecutive daily rows in COLUMNS order, starting start days after the first trading day."""
+    first = date(2016, 3, 10)
+    return [
+        ((first + timedelta(days= day)).isoformat(), day + 0.5, day + 0.25, day + 1.0, day - 1.0, day * 1000.0, day / 100)
+        for day in range(start, start + count)
+    ]
+
+class TestETHBinary(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'eth.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def header(self):
+        with open(self.path, 'rb') as f:
+            return read_header(f)
+
+    def read(self):
+        with ETHBinaryReader(self.path) as reader:
+            return reader.records()
+
+    def test_round_trip(self):
+        write(self.path, records(0, 10))
+        self.assertEqual(records(0, 10), self.read())
+        self.assertEqual(Header(VERSION, len(COLUMNS), 10, MIN_CAPACITY), self.header())
+        self.assertEqual(HEADER.size + len(COLUMNS) * MIN_CAPACITY * ITEMSIZE, os.path.getsize(self.path))
+
+    def test_append_within_capacity(self):
+        write(self.path, records(0, 10))
+        size = os.path.getsize(self.path)
+        append(self.path, records(10, 5))
+        # written into the slack: same capacity, same file
+        self.assertEqual(Header(VERSION, len(COLUMNS), 15, MIN_CAPACITY), self.header())
+        self.assertEqual(size, os.path.getsize(self.path))
+        self.assertEqual(records(0, 15), self.read())
+
+    def test_append_at_overwrites(self):
+        write(self.path, records(0, 10))
+        append(self.path, records(100, 2), at= 8)
+        self.assertEqual(records(0, 8) + records(100, 2), self.read())
+        # at is clamped to the row count, so nothing is left uninitialised
+        append(self.path, records(200, 1), at= 50)
+        self.assertEqual(records(0, 8) + records(100, 2) + records(200, 1), self.read())
+
+    def test_append_rebuilds_when_full(self):
+        write(self.path, records(0, MIN_CAPACITY - 2), capacity= MIN_CAPACITY)
+        self.assertEqual(MIN_CAPACITY, self.header().capacity)
+        append(self.path, records(MIN_CAPACITY - 2, 5))
+        # out of slack: rebuilt with double the rows it now holds
+        self.assertEqual(Header(VERSION, len(COLUMNS), MIN_CAPACITY + 3, 2 * (MIN_CAPACITY + 3)), self.header())
+        self.assertEqual(records(0, MIN_CAPACITY + 3), self.read())
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        # and the next append goes into the new slack
+        append(self.path, records(MIN_CAPACITY + 3, 1))
+        self.assertEqual(2 * (MIN_CAPACITY + 3), self.header().capacity)
+        self.assertEqual(records(0, MIN_CAPACITY + 4), self.read())
+
+    def test_column_is_zero_copy(self):
+        write(self.path, records(0, 10))
+        with ETHBinaryReader(self.path) as reader:
+            price = reader.column('price')
+            self.assertEqual([day + 0.5 for day in range(10)], list(price))
+            self.assertEqual(10, len(price))
+            if np is not None:
+                # a read-only view onto the mapping, not a copy
+                self.assertFalse(price.flags.owndata)
+                self.assertFalse(price.flags.writeable)
+                self.assertEqual(np.datetime64('2016-03-10'), reader.column('date')[0])
+            else:
+                self.assertTrue(price.readonly)
+            del price
+
+    def test_bad_header_rejected(self):
+        write(self.path, records(0, 1))
+        for field, value in [(0, b'NOPE'), (4, struct.pack('<H', VERSION + 1)), (6, struct.pack('<H', 3))]:
+            shutil.copyfile(self.path, self.path + '.bad')
+            with open(self.path + '.bad', 'r+b') as f:
+                f.seek(field)
+                f.write(value)
+                with self.assertRaises(ValueError):
+                    read_header(f)
+            with self.assertRaises(ValueError):
+                ETHBinaryReader(self.path + '.bad')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Unit tests for the local_datasets module."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from sklearn import datasets
+
+import local_datasets
+from local_datasets import *
+
+class TestLocalDatasets(unittest.TestCase):
+
+    def setUp(self):
+        # work on copies so no .npy caches are written next to the shipped CSVs
+        self.tmp = tempfile.mkdtemp()
+        self.boston = shutil.copy(os.path.join(HERE, 'bh.csv'), self.tmp)
+        self.iris = shutil.copy(os.path.join(HERE, 'iris.csv'), self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_boston(self):
+        X, y = load_boston(self.boston)
+        self.assertEqual((506, 13), X.shape)
+        self.assertEqual((506,), y.shape)
+        self.assertEqual(np.float64, X.dtype)
+        # the first tract, with medv as the target
+        self.assertAlmostEqual(0.00632, X[0, 0])
+        self.assertAlmostEqual(24.0, y[0])
+
+    def test_iris(self):
+        X, y = load_iris(self.iris)
+        self.assertEqual((150, 4), X.shape)
+        self.assertEqual((150,), y.shape)
+        # same class numbering as sklearn: 0 = Setosa, 1 = Versicolor, 2 = Virginica
+        np.testing.assert_array_equal(datasets.load_iris(return_X_y= True)[1], y)
+        self.assertEqual([50, 50, 50], list(np.bincount(y)))
+
+    def test_second_load_is_memory_mapped(self):
+        load_iris(self.iris)
+        with mock.patch.object(local_datasets.csv, 'reader', side_effect= AssertionError('CSV parsed again')):
+            X, y = load_iris(self.iris)
+        self.assertIsInstance(X, np.memmap)
+        self.assertIsInstance(y, np.memmap)
+        self.assertEqual((150, 4), X.shape)
+
+    def test_newer_csv_rebuilds(self):
+        load_boston(self.boston)
+        with open(self.boston) as f:
+            lines = f.readlines()
+        # repeat the first tract at the end
+        with open(self.boston, 'w') as f:
+            f.write(''.join(lines).rstrip('\n') + '\n' + lines[1])
+        # make sure the CSV is strictly newer than its cache, whatever the file system's timestamp resolution
+        cached = os.path.getmtime(os.path.splitext(self.boston)[0] + '.X.npy')
+        os.utime(self.boston, (time.time(), cached + 1))
+        X, y = load_boston(self.boston)
+        self.assertEqual((507, 13), X.shape)
+        np.testing.assert_array_equal(X[0], X[-1])
+
+if __name__ == '__main__':
+    unittest.main()
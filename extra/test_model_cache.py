@@ -0,0 +1,103 @@
+"""Unit tests for the model_cache module."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+from sklearn.linear_model import LinearRegression, Ridge
+
+from model_cache import *
+
+class TestModelCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ModelCache(self.tmp)
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size= (50, 3))
+        self.y = self.X @ [1.0, 2.0, 3.0]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def entries(self):
+        return sorted(os.listdir(self.tmp))
+
+    def test_key(self):
+        key = self.cache.key(Ridge(alpha= 1.0), self.X, self.y)
+        # equal estimators on equal data share a key
+        self.assertEqual(key, self.cache.key(Ridge(alpha= 1.0), self.X.copy(), self.y.copy()))
+        self.assertEqual(key, self.cache.key(Ridge(alpha= 1.0), np.asfortranarray(self.X), self.y))
+        # anything that changes the fit does not
+        changed = [
+            self.cache.key(Ridge(alpha= 2.0), self.X, self.y),
+            self.cache.key(LinearRegression(), self.X, self.y),
+            self.cache.key(Ridge(alpha= 1.0), self.X[:-1], self.y[:-1]),
+            self.cache.key(Ridge(alpha= 1.0), self.X, self.y + 1),
+            self.cache.key(Ridge(alpha= 1.0), self.X.astype(np.float32), self.y),
+            self.cache.key(Ridge(alpha= 1.0), self.X.reshape(25, 6), self.y)
+        ]
+        self.assertEqual(len(changed), len(set(changed) - { key }))
+
+    def test_fit_hit_and_miss(self):
+        model, cached = self.cache.fit(Ridge(), self.X, self.y)
+        self.assertFalse(cached)
+        again, cached = self.cache.fit(Ridge(), self.X, self.y)
+        self.assertTrue(cached)
+        np.testing.assert_array_equal(model.coef_, again.coef_)
+        # new hyperparameters or data are a miss
+        self.assertFalse(self.cache.fit(Ridge(alpha= 5.0), self.X, self.y)[1])
+        self.assertFalse(self.cache.fit(Ridge(), self.X, self.y * 2)[1])
+        self.assertEqual(3, len(self.entries()))
+
+    def test_unloadable_entry_is_a_miss(self):
+        key = self.cache.key(Ridge(), self.X, self.y)
+        # pickles naming a module and a class that no longer exist, a truncated pickle and garbage
+        for stale in [b'cno_such_module\nRidge\n.', b'csklearn.linear_model\nNoSuchRidge\n.', b'\x80\x05\x95', b'junk']:
+            with open(os.path.join(self.tmp, key + '.pkl'), 'wb') as f:
+                f.write(stale)
+            self.assertIsNone(self.cache.get(key))
+            # and fitting replaces it
+            model, cached = self.cache.fit(Ridge(), self.X, self.y)
+            self.assertFalse(cached)
+            self.assertIsInstance(self.cache.get(key), Ridge)
+
+    def test_put_is_atomic(self):
+        key = self.cache.key(Ridge(), self.X, self.y)
+        model = Ridge().fit(self.X, self.y)
+        self.cache.put(key, model)
+        self.assertEqual([key + '.pkl'], self.entries())
+        # a model that fails to pickle leaves the old entry in place and no temporary file behind
+        with self.assertRaises(Exception):
+            self.cache.put(key, lambda: None)
+        self.assertEqual([key + '.pkl'], self.entries())
+        np.testing.assert_array_equal(model.coef_, self.cache.get(key).coef_)
+
+    def test_evict_by_age(self):
+        self.cache.put('old', Ridge())
+        self.cache.put('new', Ridge())
+        now = time.time()
+        os.utime(os.path.join(self.tmp, 'old.pkl'), (now, now - MAX_AGE - 1))
+        self.cache.evict()
+        self.assertEqual(['new.pkl'], self.entries())
+
+    def test_evict_by_size(self):
+        now = time.time()
+        for age, key in enumerate(['c', 'b', 'a']):
+            self.cache.put(key, Ridge().fit(self.X, self.y))
+            os.utime(os.path.join(self.tmp, key + '.pkl'), (now, now - 100 * (age + 1)))
+        size = os.path.getsize(os.path.join(self.tmp, 'a.pkl'))
+        # a hit marks 'a', the oldest, as recently used
+        self.assertIsNotNone(self.cache.get('a'))
+        self.cache.max_bytes = 2 * size
+        self.cache.evict()
+        # least recently used goes first, which is now b
+        self.assertEqual(['a.pkl', 'c.pkl'], self.entries())
+        self.cache.max_bytes = 0
+        self.cache.evict()
+        self.assertEqual([], self.entries())
+
+if __name__ == '__main__':
+    unittest.main()
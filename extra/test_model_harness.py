@@ -0,0 +1,103 @@
+"""Unit tests for the model_harness module."""
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from model_cache import ModelCache
+from model_harness import *
+
+class OffsetModel():
+    """Predicts the first feature plus offset, and counts its predict() calls."""
+
+    def __init__(self, offset= 0, delay= 0):
+        self.offset = offset
+        self.delay = delay
+        self.predict_calls = 0
+
+    def get_params(self, deep= True):
+        return { 'offset': self.offset, 'delay': self.delay }
+
+    def fit(self, X, y):
+        time.sleep(self.delay)
+        self.fitted_ = True
+        return self
+
+    def predict(self, X):
+        self.predict_calls += 1
+        return X[:, 0] + self.offset
+
+def error(y_true, y_pred):
+    return float(np.sum(y_pred - y_true))
+
+class TestHarness(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size= (40, 3))
+        y = X[:, 0]
+        self.X_train, self.y_train = X[:30], y[:30]
+        self.splits = { 'training': (X[:30], y[:30]), 'testing': (X[30:], y[30:]) }
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def models(self):
+        ## the slow model comes first, so with a pool it finishes last
+        return { 'slow': OffsetModel(1, delay= 0.3), 'zero': OffsetModel(), 'minus': OffsetModel(-1) }
+
+    def test_one_predict_per_split(self):
+        for workers in [1, 3]:
+            results = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= workers)
+            for result in results.values():
+                self.assertEqual(len(self.splits), result.model.predict_calls)
+                self.assertEqual(set(self.splits), set(result.predictions))
+                self.assertEqual(set(self.splits), set(result.predict_times))
+                self.assertFalse(result.cached)
+
+    def test_order_matches_models(self):
+        for workers in [1, 3]:
+            results = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= workers)
+            self.assertEqual(list(self.models()), list(results))
+
+    def test_workers_match_sequential(self):
+        sequential = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= 1)
+        parallel = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= 3)
+        for name in sequential:
+            for split in self.splits:
+                np.testing.assert_array_equal(sequential[name].predictions[split], parallel[name].predictions[split])
+        metrics = { 'error': error }
+        self.assertEqual(evaluate(sequential, self.splits, metrics), evaluate(parallel, self.splits, metrics))
+
+    def test_evaluate_uses_cached_predictions(self):
+        results = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= 1)
+        calls = []
+        def metric(y_true, y_pred):
+            calls.append((y_true, y_pred))
+            return error(y_true, y_pred)
+        scores = evaluate(results, self.splits, { 'error': metric, 'again': metric })
+        # no model predicted again...
+        self.assertTrue(all(result.model.predict_calls == len(self.splits) for result in results.values()))
+        # ...every metric got the stored predictions
+        expected = [(y, results[name].predictions[split]) for name in results for split, (_, y) in self.splits.items() for _ in range(2)]
+        self.assertEqual(len(expected), len(calls))
+        for (y, predictions), (y_true, y_pred) in zip(expected, calls):
+            self.assertIs(y, y_true)
+            self.assertIs(predictions, y_pred)
+        self.assertEqual(list(self.models()), list(scores))
+        self.assertAlmostEqual(0, scores['zero']['training']['error'])
+        self.assertAlmostEqual(30, scores['slow']['training']['error'])
+
+    def test_cache(self):
+        cache = ModelCache(self.tmp)
+        first = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= 3, cache= cache)
+        second = train_models(self.models(), self.X_train, self.y_train, self.splits, workers= 3, cache= cache)
+        self.assertTrue(all(result.cached for result in second.values()))
+        for name in first:
+            np.testing.assert_array_equal(first[name].predictions['testing'], second[name].predictions['testing'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Unit tests for the model_search module."""
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.linear_model import LinearRegression
+
+import model_search
+from model_cache import ModelCache
+from model_search import *
+
+class ScaledModel(BaseEstimator, RegressorMixin):
+    """Predicts scale times the first feature; n_estimators is accepted as a resource but changes nothing."""
+
+    def __init__(self, scale= 1.0, n_estimators= 1):
+        self.scale = scale
+        self.n_estimators = n_estimators
+
+    def fit(self, X, y):
+        self.fitted_ = True
+        return self
+
+    def predict(self, X):
+        return self.scale * X[:, 0]
+
+def data(n= 60):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size= (n, 3))
+    return X, X @ [1.0, 0.5, 0.0]
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.X, self.y = data()
+        ## 27 candidates, so halving by 3 runs the full 10 -> 30 -> 90 -> 270 schedule
+        self.candidates = grid({ 'scale': [round(0.1 * i, 1) for i in range(27)] })
+
+    def test_grid(self):
+        candidates = grid({ 'a': [1, 2], 'b': ['x', 'y', 'z'] })
+        self.assertEqual(6, len(candidates))
+        self.assertEqual({ 'a': 1, 'b': 'x' }, candidates[0])
+        self.assertEqual(6, len({ tuple(c.items()) for c in candidates }))
+
+    def test_random_candidates(self):
+        distributions = { 'alpha': [0, 1, 10], 'rate': lambda rng: rng.uniform(0, 1) }
+        self.assertEqual(random_candidates(distributions, 5, seed= 1), random_candidates(distributions, 5, seed= 1))
+        self.assertTrue(all(c['alpha'] in [0, 1, 10] and 0 <= c['rate'] <= 1 for c in random_candidates(distributions, 5)))
+
+    def test_kfold(self):
+        folds = kfold(23, k= 5, seed= 0)
+        self.assertEqual(5, len(folds))
+        tests = [set(test) for _, test in folds]
+        # test folds are disjoint, cover every row and are within one row of each other in size
+        self.assertEqual(23, sum(len(test) for test in tests))
+        self.assertEqual(set(range(23)), set().union(*tests))
+        self.assertLessEqual(max(map(len, tests)) - min(map(len, tests)), 1)
+        # each training set is exactly the other rows
+        for train, test in folds:
+            self.assertEqual(set(range(23)) - set(test), set(train))
+            self.assertEqual(len(train), len(set(train)))
+        # the shuffle is seeded
+        for (a, b), (c, d) in zip(folds, kfold(23, k= 5, seed= 0)):
+            np.testing.assert_array_equal(a, c)
+            np.testing.assert_array_equal(b, d)
+
+    def test_successive_halving_schedule(self):
+        result = successive_halving(ScaledModel(), self.candidates, self.X, self.y, resource= 'n_estimators',
+                                    min_resource= 10, max_resource= 270, eta= 3, workers= 2, seed= 0)
+        rounds = {}
+        for round_number, budget, params, score in result.history:
+            rounds.setdefault(round_number, []).append((score, params))
+            self.assertEqual(budget, params['n_estimators'])
+        # 27 -> 9 -> 3 -> 1 candidates at budgets 10 -> 30 -> 90 -> 270
+        self.assertEqual([27, 9, 3, 1], [len(rounds[r]) for r in sorted(rounds)])
+        self.assertEqual([10, 30, 90, 270], [rounds[r][0][1]['n_estimators'] for r in sorted(rounds)])
+        # each round's survivors are the best third of the round before
+        for r in range(3):
+            best = sorted(rounds[r], key= lambda row: row[0])[:len(rounds[r]) // 3]
+            self.assertEqual({ p['scale'] for _, p in best }, { p['scale'] for _, p in rounds[r + 1] })
+        self.assertEqual({ 'scale': 1.0, 'n_estimators': 270 }, result.params)
+        self.assertEqual(rounds[3][0][0], result.score)
+
+    def test_plain_search(self):
+        # without a resource every candidate is cross-validated once
+        candidates = grid({ 'fit_intercept': [True, False] })
+        result = successive_halving(LinearRegression(), candidates, self.X, self.y, k= 3, workers= 2, seed= 0)
+        self.assertEqual(2, len(result.history))
+        self.assertEqual({ 0 }, { round_number for round_number, _, _, _ in result.history })
+        self.assertEqual(min(score for _, _, _, score in result.history), result.score)
+        self.assertAlmostEqual(0, result.score)
+
+    def test_cached_search(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        cache = ModelCache(tmp)
+        candidates = self.candidates[:9]
+        with mock.patch.object(model_search, 'successive_halving', wraps= model_search.successive_halving) as search:
+            first = cached_successive_halving(cache, ScaledModel(), candidates, self.X, self.y, resource= 'n_estimators',
+                                              workers= 2, seed= 0)
+            # a rerun, even with another worker count, is a hit
+            again = cached_successive_halving(cache, ScaledModel(), candidates, self.X, self.y, resource= 'n_estimators',
+                                              workers= 1, seed= 0)
+            self.assertEqual(1, search.call_count)
+            self.assertEqual(first, again)
+            # changing the settings, candidates, data or estimator is a miss
+            for args, kwargs in [
+                ((ScaledModel(), candidates, self.X, self.y), { 'resource': 'n_estimators', 'seed': 1 }),
+                ((ScaledModel(), candidates, self.X, self.y), { 'resource': 'n_estimators', 'seed': 0, 'k': 3 }),
+                ((ScaledModel(), candidates[:3], self.X, self.y), { 'resource': 'n_estimators', 'seed': 0 }),
+                ((ScaledModel(), candidates, self.X, self.y * 2), { 'resource': 'n_estimators', 'seed': 0 }),
+                ((ScaledModel(n_estimators= 2), candidates, self.X, self.y), { 'resource': 'n_estimators', 'seed': 0 })
+            ]:
+                cached_successive_halving(cache, *args, workers= 2, **kwargs)
+            self.assertEqual(6, search.call_count)
+
+    def test_scaling_curve(self):
+        candidates = grid({ 'fit_intercept': [True, False] })
+        curve = scaling_curve(LinearRegression(), candidates, self.X, self.y, worker_counts= [1, 2], k= 3, seed= 0)
+        self.assertEqual([1, 2], [workers for workers, _, _ in curve])
+        for _, seconds, throughput in curve:
+            self.assertGreater(seconds, 0)
+            # two candidates, three folds each
+            self.assertAlmostEqual(6 / seconds, throughput)
+
+if __name__ == '__main__':
+    unittest.main()
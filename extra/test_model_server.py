@@ -0,0 +1,106 @@
+"""Unit tests for the model_server module."""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+import model_server
+from model_server import *
+
+class SumModel():
+    """Predicts the sum of each row and records the size of every predict() call."""
+    n_features_in_ = 3
+
+    def __init__(self, fail_on= None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        if self.fail_on is not None and (X == self.fail_on).all(axis= 1).any():
+            raise ValueError('cannot predict this row')
+        return X.sum(axis= 1)
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_batching(self):
+        model = SumModel()
+        batcher = MicroBatcher(model, max_batch= 64, max_delay= 0.2)
+        futures = [batcher.submit([i, 1, 1]) for i in range(20)]
+        self.assertEqual([i + 2 for i in range(20)], [future.result(timeout= 5) for future in futures])
+        # rows queued within the delay share one predict call
+        self.assertEqual([20], model.calls)
+        self.assertEqual(20, batcher.stats()['mean_batch'])
+
+    def test_max_batch(self):
+        model = SumModel()
+        batcher = MicroBatcher(model, max_batch= 8, max_delay= 0.2)
+        futures = [batcher.submit([i, 0, 0]) for i in range(20)]
+        [future.result(timeout= 5) for future in futures]
+        self.assertTrue(all(size <= 8 for size in model.calls))
+        self.assertEqual(20, sum(model.calls))
+
+    def test_deadline(self):
+        # a lone row is predicted once max_delay passes, without waiting for a full batch
+        batcher = MicroBatcher(SumModel(), max_batch= 64, max_delay= 0.05)
+        start = time.perf_counter()
+        self.assertEqual(3, batcher.predict([1, 1, 1]))
+        elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, 0.04)
+        self.assertLess(elapsed, 1)
+
+    def test_malformed_row_rejected(self):
+        model = SumModel()
+        batcher = MicroBatcher(model, max_delay= 0.2)
+        first = batcher.submit([1, 1, 1])
+        with self.assertRaises(ValueError):
+            batcher.submit([1, 1])
+        with self.assertRaises(ValueError):
+            batcher.submit([[1, 1, 1]])
+        last = batcher.submit([2, 2, 2])
+        self.assertEqual((3, 6), (first.result(timeout= 5), last.result(timeout= 5)))
+
+    def test_failing_row_isolated(self):
+        # a row the model itself rejects only fails its own request
+        batcher = MicroBatcher(SumModel(fail_on= [5, 5, 5]), max_delay= 0.2)
+        futures = [batcher.submit(row) for row in ([1, 1, 1], [5, 5, 5], [2, 2, 2])]
+        self.assertEqual(3, futures[0].result(timeout= 5))
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout= 5)
+        self.assertEqual(6, futures[2].result(timeout= 5))
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = model_server._Server(('127.0.0.1', 0), make_handler({ 'sum': MicroBatcher(SumModel(), max_delay= 0.05) }))
+        threading.Thread(target= cls.server.serve_forever, daemon= True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def post(self, features):
+        request = urllib.request.Request(f'{self.url}/predict/sum', data= json.dumps({ 'features': features }).encode(),
+                                         headers= { 'Content-Type': 'application/json' })
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_bad_request_does_not_break_batch(self):
+        # a 2-feature row sent between valid rows gets a 400; its neighbours still succeed
+        with ThreadPoolExecutor(max_workers= 3) as pool:
+            results = list(pool.map(self.post, [[1, 1, 1], [1, 1], [2, 2, 2]]))
+        self.assertEqual((200, { 'prediction': 3 }), results[0])
+        self.assertEqual(400, results[1][0])
+        self.assertEqual((200, { 'prediction': 6 }), results[2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,35 @@
 import argparse
+from array import array
+import bz2
 from collections import defaultdict, namedtuple
 import csv
+import gzip
+import heapq
+import io
 import logging
+import lzma
 import matplotlib.pyplot as plt
+import operator
+import os
 from os import path
-import requests
+import pickle
 import sys
+import tempfile
+import zipfile
+
+from mpg_sketches import MPGSummary
+from mpg_store import AutoMPGStore
+import uci_fetch
+
+## optional dependencies for the columnar exports
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
 
 ## handle logger setup
 logger = logging.getLogger(__name__)
@@ -22,56 +46,293 @@ sh.setLevel(logging.INFO)
 logger.addHandler(sh)
 
 ## Record setup
-Record = namedtuple('Record', ['mpg', 'year', 'make', 'model'])
+Record = namedtuple('Record', ['mpg', 'cylinders', 'displacement', 'horsepower', 'weight', 'acceleration', 'year', 'origin', 'make', 'model'])
+
+## column name -> array typecode for the numeric columns built from the AutoMPG objects for export; missing values are
+## NaN, so everything but year (which AutoMPG always has) is stored as a double
+NUMERIC_COLUMNS = {
+    'mpg': 'd',
+    'cylinders': 'd',
+    'displacement': 'd',
+    'horsepower': 'd',
+    'weight': 'd',
+    'acceleration': 'd',
+    'year': 'q',
+    'origin': 'd'
+}
+STRING_COLUMNS = ['make', 'model']
+
+## misspelled or abbreviated make -> standard make name
+CORRECT_MAKES = {
+    'chevroelt': 'chevrolet',
+    'chevy': 'chevrolet',
+    'maxda': 'mazda',
+    'mercedes-benz': 'mercedes',
+    'toyouta': 'toyota',
+    'vokswagen': 'volkswagen',
+    'vw': 'volkswagen'
+}
+
+## sort keys for each sort order; None defers to AutoMPG.__lt__ (make, model, year, mpg)
+SORT_KEYS = {
+    'default': None,
+    'year': lambda x: (x.year, x.make, x.model, x.mpg),
+    'mpg': lambda x: (x.mpg, x.make, x.model, x.year)
+}
+
+## external sort tuning: the most and fewest objects pickled per block in a run file, and the most runs merged in one
+## pass; the block size and fan-in actually used are derived from the memory budget
+RUN_BLOCK = 1024
+MIN_RUN_BLOCK = 16
+MERGE_FANIN = 64
+
+## inputs with more rows than this are deduplicated/joined through external_sort() rather than an in-memory hash table
+HASH_LIMIT = 5000000
+
+def _to_float(value):
+    """ Converts a numeric field to a float, treating missing ('?') values as None. """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        if value is None or str(value).strip() in ('', '?'):
+            return None
+        raise
+
+def _key_getter(on):
+    """ Returns a function extracting the tuple of fields named in on from an object, namedtuple or dict. """
+    def _get(record):
+        if isinstance(record, dict):
+            return tuple(record[field] for field in on)
+        return tuple(getattr(record, field) for field in on)
+    return _get
+
+## compressed file suffix -> opener returning a text stream that decompresses incrementally
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open
+}
+
+## archive members tried, in order, when a zip is given without naming one
+DATA_MEMBERS = ['auto-mpg.data.txt', 'auto-mpg.data', 'auto-mpg.clean.txt']
+
+def _open_text(source, member= None):
+    """ Opens a plain, gzip, bz2, xz or zip source as a text stream that decompresses as it is read, so nothing is
+    extracted to disk.
+
+    Arguments
+    ---------
+    source: str; required
+    The file to read; the compression is picked from its suffix.
+
+    member: str; optional
+    For zip archives, the member to read; defaults to the first of DATA_MEMBERS present outside __MACOSX.
+    """
+    suffix = path.splitext(source)[1].lower()
+    if suffix in COMPRESSED_OPENERS:
+        return COMPRESSED_OPENERS[suffix](source, 'rt')
+    if suffix == '.zip':
+        archive = zipfile.ZipFile(source)
+        if member is None:
+            names = { path.basename(name): name for name in archive.namelist() if not name.startswith('__MACOSX') }
+            member = next((names[name] for name in DATA_MEMBERS if name in names), None)
+            if member is None:
+                archive.close()
+                raise FileNotFoundError(f'No auto-mpg data file in {source}')
+        ## the member stream holds its own reference to the archive file, which is released when the stream is closed
+        stream = archive.open(member)
+        archive.close()
+        return io.TextIOWrapper(stream, encoding= 'utf-8')
+    return open(source, 'r')
+
+def _write_run(autos, directory, block_size= RUN_BLOCK):
+    """ Pickles an already-sorted iterable of AutoMPG objects to a new run file in blocks of block_size objects and
+    returns its path. """
+    fd, run_path = tempfile.mkstemp(suffix= '.run', dir= directory)
+    with os.fdopen(fd, 'wb') as run:
+        block = []
+        for auto in autos:
+            block.append(auto)
+            if len(block) == block_size:
+                pickle.dump(block, run, protocol= pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, run, protocol= pickle.HIGHEST_PROTOCOL)
+    return run_path
+
+def _merge_plan(object_size, memory_budget):
+    """ Returns the (fan-in, block size) for merging runs of objects of about object_size bytes, so that fan-in input
+    runs plus one output run, each holding a block of objects and a file buffer, fit in memory_budget. Budgets too
+    small for that still merge two runs at a time, one object per block. """
+    ## per open run: a block of objects plus the buffer of its file object
+    fanin = memory_budget // (MIN_RUN_BLOCK * object_size + io.DEFAULT_BUFFER_SIZE) - 1
+    fanin = max(2, min(MERGE_FANIN, fanin))
+    block_size = (memory_budget // (fanin + 1) - io.DEFAULT_BUFFER_SIZE) // object_size
+    return fanin, max(1, min(RUN_BLOCK, block_size))
+
+def _footprint(obj):
+    """ Estimates the bytes held by one object: the object, its attribute dict and its values, recursing into tuples. """
+    if isinstance(obj, tuple):
+        return sys.getsizeof(obj) + sum(_footprint(item) for item in obj)
+    if hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + sys.getsizeof(vars(obj)) + sum(sys.getsizeof(v) for v in vars(obj).values())
+    return sys.getsizeof(obj)
+
+def _orderable(key):
+    """ Returns a key tuple that sorts even when some of its values are None (missing values sort last). """
+    return tuple((value is None, value) for value in key)
+
+def _merge_matches(left, right, matched):
+    """ Yields (left row, right row) for every pair of equal keys in two streams of (key, row) pairs sorted by key, and
+    flags every right row that matched in the matched bytearray. Only one run of equal right keys is held at a time. """
+    left, right = iter(left), iter(right)
+    l, r = next(left, None), next(right, None)
+    while l is not None and r is not None:
+        if l[0] < r[0]:
+            l = next(left, None)
+        elif r[0] < l[0]:
+            r = next(right, None)
+        else:
+            key = l[0]
+            rows = []
+            while r is not None and r[0] == key:
+                rows.append(r[1])
+                matched[r[1]] = 1
+                r = next(right, None)
+            while l is not None and l[0] == key:
+                for row in rows:
+                    yield l[1], row
+                l = next(left, None)
+
+def _read_run(run_path):
+    """ Streams the AutoMPG objects back out of a run file, one block in memory at a time, then deletes it. """
+    try:
+        with open(run_path, 'rb') as run:
+            while True:
+                try:
+                    block = pickle.load(run)
+                except EOFError:
+                    break
+                yield from block
+    finally:
+        os.remove(run_path)
+
+def external_sort(autos, key= None, memory_budget= 64 * 1024 * 1024, directory= None):
+    """ Sorts a stream of AutoMPG objects (or tuples, such as the (key, row) pairs dedupe() and join() sort) within a
+    memory budget and yields them in order.
+
+    Objects are collected until the budget is reached, sorted and spilled to a temporary run file; the runs are then
+    k-way merged back into a single stream, with the fan-in and run file block size chosen by _merge_plan() so the
+    merge stays within the budget too. The sort is stable, so ties keep their input order exactly as list.sort()
+    would.
+
+    Arguments
+    ---------
+    autos: iterable; required
+    The AutoMPG objects to sort, e.g. AutoMPGData._read_autos().
+
+    key: callable; optional
+    A sort key as in SORT_KEYS; None uses AutoMPG ordering.
+
+    memory_budget: int; optional
+    The approximate number of bytes of AutoMPG objects to hold in memory at once.
+
+    directory: str; optional
+    Where to put the run files; defaults to the system temporary directory.
+    """
+    with tempfile.TemporaryDirectory(dir= directory) as tmp:
+        runs = []
+        buffer = []
+        run_rows = None
+        for auto in autos:
+            if run_rows is None:
+                ## estimate the footprint of one object from the first one
+                size = _footprint(auto)
+                run_rows = max(1, memory_budget // size)
+                fanin, block_size = _merge_plan(size, memory_budget)
+            buffer.append(auto)
+            if len(buffer) >= run_rows:
+                buffer.sort(key= key)
+                runs.append(_write_run(buffer, tmp, block_size))
+                buffer = []
+        buffer.sort(key= key)
+        if not runs:
+            ## everything fit in the budget
+            yield from buffer
+            return
+        if buffer:
+            runs.append(_write_run(buffer, tmp, block_size))
+        buffer = None
+        logger.debug(f'Merging {len(runs)} sorted runs, {fanin} at a time in blocks of {block_size}')
+        ## merge in passes until one pass can take every run; heapq.merge favours earlier runs on ties, which keeps the
+        ## sort stable as long as runs stay in input order
+        while len(runs) > fanin:
+            runs = [
+                _write_run(heapq.merge(*(_read_run(r) for r in runs[i:i + fanin]), key= key), tmp, block_size)
+                for i in range(0, len(runs), fanin)
+            ]
+        yield from heapq.merge(*(_read_run(r) for r in runs), key= key)
 
 class AutoMPGData():
-    def __init__(self):
+    def __init__(self, load= True, source= None, member= None):
+        """Loads the dataset, from the working directory by default or straight out of a (possibly compressed) source.
+
+        Arguments
+        ---------
+        load: bool; optional
+        Whether to populate the data attribute now; streaming callers (see export_sorted) skip this.
+
+        source: str; optional
+        A raw or cleaned auto-mpg file, optionally gzip/bz2/xz-compressed or inside a zip archive.
+
+        member: str; optional
+        The zip archive member to read.
+        """
+        self.source = source
+        self.member = member
         self.data = []
+        ## numeric column buffers, built on demand by _numeric_columns() along with the rows they were built from
+        self._columns = None
+        self._column_rows = None
         self.response_code = None
         ## call _load_data() to populate the data attribute
-        self._load_data()
+        if load:
+            self._load_data()
         
     def __iter__(self):
         """Return iterable class."""
         return iter(self.data)
     
-    def _get_data(self):
-        """Downloads data from the interwebs to be loaded into the data attribute."""
+    def _get_data(self, mirrors= uci_fetch.MIRRORS, race= False):
+        """Downloads the auto-mpg files from the interwebs, concurrently and with mirror failover, to be loaded into the
+        data attribute."""
         try:
-            
-            with open('auto-mpg.data.txt', 'w') as data_file:
-                url = 'https://archive.ics.uci.edu/ml/machine-learning-databases/auto-mpg/auto-mpg.data'
-                r = requests.get(url, stream=True)
-                if r.status_code == 200:
-                    logger.debug(f'response code from url: 200')
-                    self.response_code = 200
-                    for line in r.iter_lines():
-                        data_file.write(line.decode() + '\n')
-                else:
-                    self.response_code = r.status_code
-                    logger.info(f'{url} returned status code {r.status_code}')
+            for result in uci_fetch.fetch(mirrors= mirrors, race= race):
+                logger.debug(f'{result.url}: {result.bytes} bytes in {result.seconds:.3f}s ({result.bandwidth / 1024:.1f} KiB/s)')
+            self.response_code = 200
+        except uci_fetch.FetchError as e:
+            self.response_code = e.status
+            logger.info(f'Could not download the dataset: {e}')
         except Exception as e:
             logger.info(f'Unexpected error writing to file {str(e)}. Exiting.')
             sys.exit()
 
     def _load_data(self):
         """Load a data file into AutoMPG objects and add them to state."""
+        self._ensure_data()
+        try:
+            for auto in self._read_autos(self.source or 'auto-mpg.clean.txt', self.member):
+                ## append the auto object
+                self.data.append(auto)
+        except Exception as e:
+            logger.info(f'Error occurred: {e}')
 
-        def __correct_car_make(car_make):
-            """ Corrects given make names to a standard make name. """
-            ## define model corrections
-            correct_makes = {
-                'chevroelt': 'chevrolet',
-                'chevy': 'chevrolet',
-                'maxda': 'mazda',
-                'mercedes-benz': 'mercedes',
-                'toyouta': 'toyota',
-                'vokswagen': 'volkswagen',
-                'vw': 'volkswagen'
-            }
-            ## return corrected make
-            return correct_makes[car_make] if car_make in correct_makes.keys() else car_make
-
+    def _ensure_data(self):
+        """Downloads and cleans the dataset if either file is missing from the working directory."""
+        if self.source:
+            ## reading from an explicit source; nothing to fetch or clean
+            return
         logger.debug('checking auto-mpg.data.txt')
         if not path.exists('auto-mpg.data.txt'):
             ## file not present, get it
@@ -80,32 +341,31 @@ class AutoMPGData():
         if not path.exists('auto-mpg.clean.txt'):
             ## file not present, clean it
             self._clean_data()
-        
+
+    def _read_autos(self, source= 'auto-mpg.clean.txt', member= None):
+        """Lazily parses a raw or cleaned data file, yielding one AutoMPG object per row. Compressed sources are
+        decompressed and cleaned line by line as they are read."""
+
         ## we got the data and we cleaned it
-        logger.debug('checking auto-mpg.clean.txt')
-        try:
-            with open('auto-mpg.clean.txt', 'r') as clean_data:
-                logger.debug('auto-mpg.clean.txt exists')
-                ## counter for auto objects
-                counter = 0
-                logger.debug('Parsing auto-mpg.clean.txt into AutoMPG objects')
-                for auto_record in csv.reader(clean_data, delimiter= ' ', skipinitialspace= True):
-                    ## split the car name into 2 tokens
-                    split = auto_record[8].replace('\'', '').split(' ', 1)
-                    ## handle the case for 'subaru'
-                    if len(split) < 2:
-                        make = f'{split[0]}'
-                        auto = Record(auto_record[0], auto_record[6], __correct_car_make(make), '')
-                    elif len(split) == 2:
-                        make = f'{split[0]}'
-                        model = f'{split[1]}'
-                        auto = Record(auto_record[0], auto_record[6], __correct_car_make(make), model)
-                    counter += 1
-                    ## append the auto object
-                    self.data.append(AutoMPG(auto.make, auto.model, auto.year, auto.mpg))
-        except Exception as e:
-            logger.info(f'Error occurred: {e}')
-         
+        logger.debug(f'checking {source}')
+        with _open_text(source, member) as clean_data:
+            logger.debug(f'{source} exists')
+            logger.debug(f'Parsing {source} into AutoMPG objects')
+            ## the same tab expansion _clean_data applies, so raw files can be read without a cleaned copy
+            for auto_record in csv.reader((line.expandtabs(1) for line in clean_data), delimiter= ' ', skipinitialspace= True):
+                ## split the car name into 2 tokens
+                split = auto_record[8].replace('\'', '').split(' ', 1)
+                ## handle the case for 'subaru'
+                if len(split) < 2:
+                    make = f'{split[0]}'
+                    auto = Record(*auto_record[:8], CORRECT_MAKES.get(make, make), '')
+                elif len(split) == 2:
+                    make = f'{split[0]}'
+                    model = f'{split[1]}'
+                    auto = Record(*auto_record[:8], CORRECT_MAKES.get(make, make), model)
+                yield AutoMPG(auto.make, auto.model, auto.year, auto.mpg, auto.cylinders, auto.displacement,
+                              auto.horsepower, auto.weight, auto.acceleration, auto.origin)
+
     def _clean_data(self):
         """Read the auto-mpg dataset and generates a 'cleansed', whitespace-delimited file."""
         if not path.exists('auto-mpg.data.txt'):
@@ -124,63 +384,353 @@ class AutoMPGData():
                 logger.info('File error occurred: {e}. Exiting')
                 sys.exit()
 
+    def _numeric_columns(self):
+        """Returns the numeric columns as arrays, building them from the data attribute on first use and whenever it
+        has changed since.
+
+        The data attribute is a public list that callers may reorder or extend, so the columns are checked against the
+        objects they were built from, by identity; sorts therefore never touch the columns, they just go stale. The
+        AutoMPG objects themselves are treated as immutable, as they already are by hashing.
+
+        The check is a scan over the whole list on every call, and the columns are kept alongside a second list of
+        the objects they were built from; a rebuild reads every attribute of every object.
+        """
+        rows = self._column_rows
+        if self._columns is None or len(rows) != len(self.data) or not all(map(operator.is_, rows, self.data)):
+            logger.debug('Building numeric columns from AutoMPG objects')
+            nan = float('nan')
+            self._columns = {
+                name: array(typecode, [nan if value is None else value for value in map(operator.attrgetter(name), self.data)])
+                for name, typecode in NUMERIC_COLUMNS.items()
+            }
+            self._column_rows = list(self.data)
+        return self._columns
+
+    def _sort(self, key= None):
+        """Stably sorts the data attribute by key (or by AutoMPG ordering); the columns are rebuilt on next export."""
+        self.data.sort(key= key)
+
+    def to_numpy(self, columns= None):
+        """Returns columns as numpy arrays built from the cached column buffers.
+
+        Every call first scans the data attribute to check the buffers are still current (see _numeric_columns()),
+        and rebuilds them from the AutoMPG objects if it changed, so exports are O(n) even when nothing was rebuilt.
+
+        A single column name returns a 1-D array: a read-only, zero-copy view for numeric columns, a unicode array for
+        make and model. A list of numeric column names (default: all of them) returns one contiguous rows x columns float64
+        array. Missing values (e.g. '?' horsepower) are NaN.
+
+        Arguments
+        ---------
+        columns: str or list; optional
+        A column name or list of numeric column names.
+        """
+        if np is None:
+            raise ImportError('to_numpy() requires numpy')
+        if isinstance(columns, str):
+            if columns in STRING_COLUMNS:
+                return np.array([getattr(auto, columns) for auto in self.data], dtype= str)
+            column = self._numeric_columns()[columns]
+            view = np.frombuffer(column, dtype= np.dtype(column.typecode))
+            ## the view shares memory with the column buffer; callers must not be able to write through it
+            view.setflags(write= False)
+            return view
+        columns = columns or list(NUMERIC_COLUMNS)
+        numeric = self._numeric_columns()
+        matrix = np.empty((len(self.data), len(columns)), dtype= np.float64)
+        for index, name in enumerate(columns):
+            matrix[:, index] = np.frombuffer(numeric[name], dtype= np.dtype(numeric[name].typecode))
+        return matrix
+
+    def to_arrow(self, columns= None):
+        """Returns a pyarrow Table whose numeric columns wrap the column buffers without copying. As with to_numpy(),
+        the buffers are first checked against the data attribute and rebuilt if they are stale.
+
+        Missing values become Arrow nulls via a validity bitmap rather than NaN.
+
+        Arguments
+        ---------
+        columns: list; optional
+        The column names to export; defaults to every numeric column followed by make and model.
+        """
+        if pa is None or np is None:
+            raise ImportError('to_arrow() requires pyarrow and numpy')
+        numeric = self._numeric_columns()
+        columns = columns or list(NUMERIC_COLUMNS) + STRING_COLUMNS
+        arrays = []
+        for name in columns:
+            if name in STRING_COLUMNS:
+                arrays.append(pa.array([getattr(auto, name) for auto in self.data], type= pa.string()))
+                continue
+            column = numeric[name]
+            if column.typecode == 'q':
+                arrays.append(pa.Array.from_buffers(pa.int64(), len(column), [None, pa.py_buffer(column)]))
+                continue
+            valid = ~np.isnan(np.frombuffer(column, dtype= np.float64))
+            null_count = len(column) - int(valid.sum())
+            validity = pa.py_buffer(np.packbits(valid, bitorder= 'little')) if null_count else None
+            arrays.append(pa.Array.from_buffers(pa.float64(), len(column), [validity, pa.py_buffer(column)], null_count= null_count))
+        return pa.Table.from_arrays(arrays, names= columns)
+
+    def _keep(self, indices):
+        """Keeps only the rows at indices (in that order) in the data attribute."""
+        self.data = [self.data[i] for i in indices]
+
+    def dedupe(self, on= None, method= 'auto', memory_budget= 64 * 1024 * 1024):
+        """Removes duplicate rows, keeping the first occurrence of each, and returns how many were removed.
+
+        Arguments
+        ---------
+        on: list; optional
+        The attribute names that identify a duplicate; defaults to AutoMPG equality (make, model, year, mpg).
+
+        method: str; optional
+        'hash' keeps a set of seen keys. 'sort' sorts (key, row) pairs with external_sort() and flags every row after
+        the first in each run of equal keys, so the keys never have to fit in memory at once. Both keep the survivors
+        in their current order, so 'auto', which hashes unless there are more than HASH_LIMIT rows, gives the same
+        result on either side of the limit.
+
+        memory_budget: int; optional
+        The approximate number of bytes of keys the 'sort' method holds in memory.
+        """
+        if method == 'auto':
+            method = 'hash' if len(self.data) <= HASH_LIMIT else 'sort'
+        before = len(self.data)
+        if method == 'hash':
+            key = _key_getter(on) if on else (lambda auto: auto)
+            seen = set()
+            keep = []
+            for index, auto in enumerate(self.data):
+                k = key(auto)
+                if k not in seen:
+                    seen.add(k)
+                    keep.append(index)
+        elif method == 'sort':
+            key = _key_getter(on or ('make', 'model', 'year', 'mpg'))
+            pairs = ((_orderable(key(auto)), index) for index, auto in enumerate(self.data))
+            ## the sort is stable, so the first occurrence of each key comes first in its run
+            duplicate = bytearray(before)
+            previous = None
+            for n, (k, index) in enumerate(external_sort(pairs, operator.itemgetter(0), memory_budget)):
+                if n and k == previous:
+                    duplicate[index] = 1
+                previous = k
+            keep = [index for index in range(before) if not duplicate[index]]
+        else:
+            raise ValueError(f'Unknown dedupe method: {method}')
+        self._keep(keep)
+        logger.debug(f'Removed {before - len(self.data)} duplicate AutoMPG objects')
+        return before - len(self.data)
+
+    def join(self, other, on= ('make', 'model', 'year'), how= 'inner', method= 'auto', memory_budget= 64 * 1024 * 1024):
+        """Joins the data attribute against another dataset and returns a list of (left, right) pairs.
+
+        Unmatched rows are paired with None for 'left', 'right' and 'outer' joins.
+
+        Arguments
+        ---------
+        other: iterable; required
+        Another AutoMPGData, or any iterable of objects, namedtuples or dicts (e.g. an enrichment table).
+
+        on: list; optional
+        The field names to join on; both sides must have them.
+
+        how: str; optional
+        One of 'inner', 'left', 'right' or 'outer'.
+
+        method: str; optional
+        'hash' builds a hash table on other and probes it with each row. 'merge' sorts the (key, row) pairs of both
+        sides with external_sort(), merges them into matching (row, row) pairs and sorts those back into row order,
+        so no hash table is needed. Either way pairs come out in the order of the data attribute, each row's matches
+        in other's order, then other's unmatched rows; 'auto' hashes unless other has more than HASH_LIMIT rows.
+
+        memory_budget: int; optional
+        The approximate number of bytes of keys and row pairs the 'merge' method holds in memory.
+        """
+        if how not in ('inner', 'left', 'right', 'outer'):
+            raise ValueError(f'Unknown join type: {how}')
+        key = _key_getter(on)
+        left = self.data
+        right = list(other)
+        if method == 'auto':
+            method = 'hash' if len(right) <= HASH_LIMIT else 'merge'
+        keep_left = how in ('left', 'outer')
+        keep_right = how in ('right', 'outer')
+        pairs = []
+
+        if method == 'hash':
+            ## build on the right, probe with the left
+            table = defaultdict(list)
+            for index, record in enumerate(right):
+                table[key(record)].append(index)
+            matched = set()
+            for auto in left:
+                indices = table.get(key(auto))
+                if indices:
+                    pairs.extend((auto, right[i]) for i in indices)
+                    matched.update(indices)
+                elif keep_left:
+                    pairs.append((auto, None))
+            if keep_right:
+                pairs.extend((None, record) for index, record in enumerate(right) if index not in matched)
+
+        elif method == 'merge':
+            by_key = operator.itemgetter(0)
+            left_keys = external_sort(((_orderable(key(auto)), i) for i, auto in enumerate(left)), by_key, memory_budget)
+            right_keys = external_sort(((_orderable(key(record)), j) for j, record in enumerate(right)), by_key, memory_budget)
+            matched = bytearray(len(right))
+            ## external_sort reads all of its input before yielding, so matched is complete before any pair comes out
+            matches = external_sort(_merge_matches(left_keys, right_keys, matched), None, memory_budget)
+            match = next(matches, None)
+            for i, auto in enumerate(left):
+                if match is not None and match[0] == i:
+                    while match is not None and match[0] == i:
+                        pairs.append((auto, right[match[1]]))
+                        match = next(matches, None)
+                elif keep_left:
+                    pairs.append((auto, None))
+            if keep_right:
+                pairs.extend((None, record) for j, record in enumerate(right) if not matched[j])
+
+        else:
+            raise ValueError(f'Unknown join method: {method}')
+        logger.debug(f'Joined {len(left)} x {len(right)} rows on {on} into {len(pairs)} pairs')
+        return pairs
+
     def mpg_by_year(self):
         """Returns a dictionary where the keys are the years that are present in the dataset and the values are the 
         average MPG for all cars in the year. """
-        ## create reference dict and aggregated dict
-        reference_mpgs = defaultdict(list)
-        year_avg_mpgs = defaultdict(int)
-        ## loop through the data and add to both dicts
+        ## keep a running [sum, count] per year rather than every mpg
+        totals = defaultdict(lambda: [0, 0])
         for auto in self.data:
-            ## get the year
-            the_year = auto.year
-            ## maintain a list of mpgs for each key=year
-            reference_mpgs[the_year].append(auto.mpg)
-            ## update the cumulative mpg as we read auto objects
-            year_avg_mpgs[the_year] = sum(reference_mpgs[the_year]) / len(reference_mpgs[the_year])
+            totals[auto.year][0] += auto.mpg
+            totals[auto.year][1] += 1
+        year_avg_mpgs = defaultdict(int)
+        for the_year, (mpg_sum, count) in totals.items():
+            year_avg_mpgs[the_year] = mpg_sum / count
         return year_avg_mpgs
 
     def mpg_by_make(self):
         """Returns a dictionary where the keys are the makes that are present in the dataset and the values are the
         average MPG for all cars of that make."""
-        ## create reference dict and aggregated dict
-        reference_mpgs = defaultdict(list)
-        make_avg_mpgs = defaultdict(str)
-        ## loop through the data and add to both dicts
+        ## keep a running [sum, count] per make rather than every mpg
+        totals = defaultdict(lambda: [0, 0])
         for auto in self.data:
-            ## get the year
-            the_make = auto.make
-            ## maintain a list of mpgs for each key=make
-            reference_mpgs[the_make].append(auto.mpg)
-            ## update the cumulative mpg as we read auto objects
-            make_avg_mpgs[the_make] = sum(reference_mpgs[the_make]) / len(reference_mpgs[the_make])
+            totals[auto.make][0] += auto.mpg
+            totals[auto.make][1] += 1
+        make_avg_mpgs = defaultdict(str)
+        for the_make, (mpg_sum, count) in totals.items():
+            make_avg_mpgs[the_make] = mpg_sum / count
         return make_avg_mpgs
 
+    def summarize(self, stream= False, summary= None, **options):
+        """Returns an MPGSummary of the dataset: exact averages, KLL mpg quantiles per year and make, HyperLogLog
+        distinct-model counts per make and count-min heavy-hitter makes, all in memory bounded by the number of years
+        and makes.
+
+        Arguments
+        ---------
+        stream: bool; optional
+        Read the records straight from the source (or the cleaned file) instead of the data attribute, so the dataset is
+        never held in memory.
+
+        summary: MPGSummary; optional
+        An existing summary to add to, e.g. to combine shards; a new one is made from options otherwise.
+
+        options: optional
+        Any MPGSummary arguments (k, precision, epsilon, delta, top, seed).
+        """
+        summary = summary if summary is not None else MPGSummary(**options)
+        if stream:
+            self._ensure_data()
+            autos = self._read_autos(self.source or 'auto-mpg.clean.txt', self.member)
+        else:
+            autos = self.data
+        for auto in autos:
+            summary.update(auto)
+        logger.debug(f'Summarized {summary.count} AutoMPG objects')
+        return summary
+
     def sort_by_default(self):
         """Sorts the data attribute by make, model, year, then mpg."""
-        self.data.sort()
+        self._sort(key= SORT_KEYS['default'])
 
     def sort_by_year(self):
         """Sorts the data attribute by year first."""
         logger.debug('Sorting AutoMPG objects by year')
-        self.data.sort(key= lambda x: (x.year, x.make, x.model, x.mpg))
+        self._sort(key= SORT_KEYS['year'])
 
     def sort_by_mpg(self):
         """Sorts the data attribute by mpg first."""
         logger.debug('Sorting AutoMPG objects by mpg')
-        self.data.sort(key= lambda x: (x.mpg, x.make, x.model, x.year))
+        self._sort(key= SORT_KEYS['mpg'])
+
+    def export_sorted(self, order= 'default', memory_budget= None):
+        """Yields AutoMPG objects in the given sort order.
+
+        Without a memory budget the data attribute is sorted in place with the matching sort_by_* method. With one, the
+        cleaned file is streamed through external_sort() instead, so only about memory_budget bytes of objects are
+        held at a time and the data attribute is never populated.
+
+        Arguments
+        ---------
+        order: str; optional
+        One of 'default', 'year' or 'mpg'.
+
+        memory_budget: int; optional
+        The approximate number of bytes of AutoMPG objects to hold in memory while sorting.
+        """
+        if memory_budget is None:
+            getattr(self, f'sort_by_{order}')()
+            yield from self.data
+        else:
+            self._ensure_data()
+            logger.debug(f'Sorting AutoMPG objects by {order} within {memory_budget} bytes')
+            yield from external_sort(self._read_autos(self.source or 'auto-mpg.clean.txt', self.member), SORT_KEYS[order], memory_budget)
+
+    def to_sqlite(self, db_path= 'auto-mpg.db', stream= False):
+        """Bulk-loads the dataset into a SQLite database and returns the open AutoMPGStore, which answers mpg_by_year,
+        mpg_by_make, the sorts and filters as SQL from then on.
+
+        Arguments
+        ---------
+        db_path: str; optional
+        The database file; any records already in it are replaced.
+
+        stream: bool; optional
+        Load the records straight from the source (or the cleaned file) instead of the data attribute.
+        """
+        store = AutoMPGStore(db_path, AutoMPG)
+        source = self.source or 'auto-mpg.clean.txt'
+        if stream:
+            self._ensure_data()
+            rows = store.load(self._read_autos(source, self.member), source)
+        else:
+            rows = store.load(self.data, source if path.exists(source) else None)
+        logger.debug(f'Loaded {rows} AutoMPG objects into {db_path}')
+        return store
 
 class AutoMPG():
-    def __init__(self, make, model, year, mpg):
+    def __init__(self, make, model, year, mpg, cylinders= None, displacement= None, horsepower= None, weight= None,
+                 acceleration= None, origin= None):
+
         ## handle cases for year
         if len(str(year)) == 1:
             self.year = int('190' + str(year))
         elif len(str(year)) == 2:
             self.year = int('19' + str(year))
+        elif len(str(year)) == 4:
+            self.year = int(year)
 
         self.make = str(make)
         self.model = str(model)
         self.mpg = float(mpg)
+        self.cylinders = _to_float(cylinders)
+        self.displacement = _to_float(displacement)
+        self.horsepower = _to_float(horsepower)
+        self.weight = _to_float(weight)
+        self.acceleration = _to_float(acceleration)
+        self.origin = _to_float(origin)
     
     def __repr__(self):
         """Return canonical representation of the class."""
@@ -220,20 +770,30 @@ def main():
     parser.add_argument('-s', '--sort', metavar= '<sort order>', choices = ['year', 'mpg', 'default'], type= str, dest= 'sort_order', default= 'default')
     parser.add_argument('-o', '--ofile', metavar= '<output file>', dest= 'output_file', type= str, default= 'std_out')
     parser.add_argument('-p', '--plot', action= 'store_true')
+    parser.add_argument('-m', '--memory-budget', metavar= '<bytes>', dest= 'memory_budget', type= int, default= None,
+                        help= 'Sort on disk, holding roughly this many bytes of records in memory.')
+    parser.add_argument('-f', '--file', metavar= '<data file>', dest= 'source', type= str, default= None,
+                        help= 'Read a raw or cleaned data file, optionally .gz/.bz2/.xz/.zip, instead of the working directory copy.')
+    parser.add_argument('-d', '--db', metavar= '<database file>', dest= 'db', type= str, default= None,
+                        help= 'Answer from this SQLite database, (re)loading it only when the data file has changed.')
     args = parser.parse_args()
     print(args)
 
-    ## instantiate AutoMPGData
-    autos = AutoMPGData()
+    if args.db:
+        ## open the database, reloading it if it was built from another or an older data file
+        autos = AutoMPGStore(args.db, AutoMPG)
+        if not autos.is_current(args.source or 'auto-mpg.clean.txt'):
+            autos.close()
+            autos = AutoMPGData(load= False, source= args.source).to_sqlite(args.db, stream= True)
+        streaming = False
+    else:
+        ## instantiate AutoMPGData; with a memory budget the records are streamed from disk instead of loaded
+        streaming = args.memory_budget is not None and args.command in ('print', 'summary')
+        autos = AutoMPGData(load= not streaming, source= args.source)
 
     if args.command == 'print': ## do basic printing
         ## do sorting
-        if args.sort_order == 'year':
-            autos.sort_by_year()
-        elif args.sort_order == 'mpg':
-             autos.sort_by_mpg()
-        else:
-            autos.sort_by_default()
+        autos = autos.select(args.sort_order) if args.db else autos.export_sorted(args.sort_order, args.memory_budget)
 
         if args.output_file != 'std_out':
             ## output RAW data to csv
@@ -252,15 +812,40 @@ def main():
             for auto in autos:
                 print(f'\"{auto.make}\", \"{auto.model}\", \"{auto.year}\", \"{auto.mpg}\"', file= sys.stdout)
 
+    elif args.command == 'summary': ## do sketch aggregation by make
+        if args.db:
+            summary = MPGSummary()
+            for auto in autos.select():
+                summary.update(auto)
+        else:
+            summary = autos.summarize(stream= streaming)
+        quantiles = summary.quantiles_by_make((0.1, 0.5, 0.9))
+        models = summary.models_by_make()
+        csv_columns = ['make', 'avg_mpg', 'p10_mpg', 'median_mpg', 'p90_mpg', 'models']
+        rows = [[make, avg, *quantiles[make], models[make]] for make, avg in sorted(summary.mpg_by_make().items())]
+        if args.output_file != 'std_out':
+            try:
+                with open(args.output_file, 'w') as outfile:
+                    auto_writer = csv.writer(outfile, delimiter= ',', quotechar= '"', quoting= csv.QUOTE_ALL)
+                    auto_writer.writerow(csv_columns)
+                    auto_writer.writerows(rows)
+            except Exception as e:
+                print(f'Something bad happened {e}')
+        else:
+            print(', '.join(f'\"{column}\"' for column in csv_columns), file= sys.stdout)
+            for row in rows:
+                print(', '.join(f'\"{value}\"' for value in row), file= sys.stdout)
+            print('top makes: ' + ', '.join(f'{make} ({count})' for make, count in summary.top_makes()), file= sys.stdout)
+
     elif args and args.command != 'print': ## do mpg_by_year aggregation
         ## get the dictionary and set the header values
         title = None
         if args.command == 'mpg_by_year':
-            agg = AutoMPGData().mpg_by_year()
+            agg = autos.mpg_by_year()
             csv_columns = ['year', 'avg_mpg']
             title = 'Miles per Gallon by Year'
         else:
-            agg = AutoMPGData().mpg_by_make()
+            agg = autos.mpg_by_make()
             csv_columns = ['make', 'avg_mpg']
             title = 'Miles per Gallon by Make'
 
@@ -0,0 +1,353 @@
+"""Fixed-memory, mergeable sketches for summarizing auto-mpg streams too large to hold.
+
+Each sketch takes one value at a time, holds a bounded amount of state whatever the stream length, and can be merged
+with a sketch of another shard built with the same parameters; the merge answers as if one sketch had seen both
+streams.
+
+    KLLSketch       quantiles; normalized rank error about 1.65% for k = 200, with 99% confidence, in fewer than 3k values
+    HyperLogLog     distinct counts; relative standard error 1.04 / sqrt(2 ** precision), 1.6% in 4 KiB for precision 12
+    CountMinSketch  frequencies; over-counts by at most epsilon * N with probability 1 - delta, never under-counts
+
+MPGSummary combines them into the per-year and per-make aggregates AutoMPGData reports.
+"""
+from array import array
+import hashlib
+import math
+import random
+
+def _hash64(value):
+    """ A 64-bit hash of str(value) that, unlike hash(), is the same in every process, so shards built elsewhere merge. """
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size= 8).digest(), 'little')
+
+class KLLSketch():
+    def __init__(self, k= 200, seed= None):
+        """Quantile sketch after Karnin, Lang and Liberty (2016).
+
+        Values land in a stack of compactors; level h holds values standing in for 2 ** h inputs each. When a level is
+        full it is sorted and every other value (starting at a random offset) is promoted, halving it. Capacities shrink
+        by 2/3 per level below the top, so the sketch retains fewer than 3k values (plus one per level) in total.
+
+        Arguments
+        ---------
+        k: int; optional
+        The capacity of the top compactor; the rank error shrinks as O(1 / k).
+
+        seed: int; optional
+        A seed for the compaction coin flips.
+        """
+        self.k = k
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.compactors = [[]]
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def __len__(self):
+        """Returns the number of values seen."""
+        return self.count
+
+    def _capacity(self, level):
+        """Returns the number of values a level may hold before it is compacted."""
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _grow(self):
+        """Adds a level on top and recomputes the total capacity."""
+        self.compactors.append([])
+        self._max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        """Compacts full levels, lowest first, until the sketch is back under its total capacity."""
+        for level in range(len(self.compactors)):
+            items = self.compactors[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self._grow()
+                items.sort()
+                ## promote every other value; an odd one out stays behind at this level
+                leftover = [items.pop()] if len(items) % 2 else []
+                self.compactors[level + 1].extend(items[self._rng.random() < 0.5::2])
+                self.compactors[level] = leftover
+                self._size = sum(len(c) for c in self.compactors)
+                if self._size < self._max_size:
+                    break
+
+    def update(self, value):
+        """Adds one value to the sketch."""
+        self.count += 1
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        self.compactors[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        """Folds another KLLSketch into this one and returns self."""
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None or other.min < self.min else self.min
+            self.max = other.max if self.max is None or other.max > self.max else self.max
+        self._size = sum(len(c) for c in self.compactors)
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def _weighted(self):
+        """Returns the retained values with their weights, in value order."""
+        return sorted((value, 2 ** level) for level, items in enumerate(self.compactors) for value in items)
+
+    def rank(self, value):
+        """Returns the estimated fraction of values less than or equal to value."""
+        if not self.count:
+            return None
+        return sum(weight for v, weight in self._weighted() if v <= value) / self.count
+
+    def quantile(self, q):
+        """Returns the estimated q-th quantile (0 <= q <= 1), or None for an empty sketch."""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """Returns the estimated quantile for each q in qs with a single pass over the retained values."""
+        if not self.count:
+            return [None for _ in qs]
+        weighted = self._weighted()
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.min)
+                continue
+            if q >= 1:
+                results.append(self.max)
+                continue
+            target = q * self.count
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    break
+            results.append(value)
+        return results
+
+class HyperLogLog():
+    def __init__(self, precision= 12):
+        """Distinct-count sketch after Flajolet et al. (2007), with linear counting for small cardinalities.
+
+        Each value is hashed; the first precision bits pick one of 2 ** precision one-byte registers, which keeps the
+        longest run of leading zeros seen in the remaining bits.
+
+        Arguments
+        ---------
+        precision: int; optional
+        The number of index bits, 4 to 16; memory is 2 ** precision bytes.
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f'precision must be between 4 and 16, not {precision}')
+        self.precision = precision
+        self.registers = bytearray(2 ** precision)
+
+    def update(self, value):
+        """Adds one value (compared by str()) to the sketch."""
+        h = _hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rho = (64 - self.precision) - rest.bit_length() + 1
+        if rho > self.registers[index]:
+            self.registers[index] = rho
+
+    def merge(self, other):
+        """Folds another HyperLogLog of the same precision into this one and returns self."""
+        if other.precision != self.precision:
+            raise ValueError(f'Cannot merge HyperLogLogs of precision {self.precision} and {other.precision}')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Returns the estimated number of distinct values."""
+        m = len(self.registers)
+        alpha = { 16: 0.673, 32: 0.697, 64: 0.709 }.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            ## small range: linear counting over the empty registers is far more accurate
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        """Returns the estimated number of distinct values."""
+        return self.count()
+
+class CountMinSketch():
+    def __init__(self, epsilon= 0.01, delta= 0.01, top= 32):
+        """Frequency sketch after Cormode and Muthukrishnan (2005) that also tracks the heaviest keys.
+
+        A depth x width table of counters; each key increments one counter per row and its estimate is the smallest of
+        them. Alongside it, the top keys by estimate are kept as heavy-hitter candidates.
+
+        Arguments
+        ---------
+        epsilon: float; optional
+        The additive error as a fraction of the total count; width is ceil(e / epsilon).
+
+        delta: float; optional
+        The probability an estimate exceeds that error; depth is ceil(ln(1 / delta)).
+
+        top: int; optional
+        The number of heavy-hitter candidates kept; keys above 1 / top of the stream are among them with high probability.
+        """
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.top = top
+        self.total = 0
+        self.table = [array('q', bytes(8 * self.width)) for _ in range(self.depth)]
+        self.candidates = {}
+
+    def _cells(self, key):
+        """Returns one counter index per row for key, by double hashing one 64-bit hash."""
+        h = _hash64(key)
+        h1, h2 = h & 0xffffffff, (h >> 32) | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def estimate(self, key):
+        """Returns the estimated count of key; never below the true count."""
+        return min(row[cell] for row, cell in zip(self.table, self._cells(key)))
+
+    def _track(self, key, estimate):
+        """Keeps key among the heavy-hitter candidates if it is one of the top estimates."""
+        if key in self.candidates or len(self.candidates) < self.top:
+            self.candidates[key] = estimate
+            return
+        lightest = min(self.candidates, key= self.candidates.get)
+        if estimate > self.candidates[lightest]:
+            del self.candidates[lightest]
+            self.candidates[key] = estimate
+
+    def update(self, key, count= 1):
+        """Adds count occurrences of key."""
+        self.total += count
+        cells = self._cells(key)
+        for row, cell in zip(self.table, cells):
+            row[cell] += count
+        self._track(key, min(row[cell] for row, cell in zip(self.table, cells)))
+
+    def merge(self, other):
+        """Folds another CountMinSketch of the same shape into this one and returns self."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('Cannot merge count-min sketches of different shapes')
+        for row, other_row in zip(self.table, other.table):
+            for cell, value in enumerate(other_row):
+                row[cell] += value
+        self.total += other.total
+        keys = set(self.candidates) | set(other.candidates)
+        self.candidates = {}
+        for key in keys:
+            self._track(key, self.estimate(key))
+        return self
+
+    def heavy_hitters(self, phi= 0.05):
+        """Returns (key, estimated count) for every candidate estimated above phi of the stream, heaviest first.
+
+        With high probability every key with a true count above phi * N is reported (for phi >= 1 / top), and none
+        below (phi - epsilon) * N.
+        """
+        hitters = [(key, count) for key, count in self.candidates.items() if count >= phi * self.total]
+        return sorted(hitters, key= lambda x: (-x[1], str(x[0])))
+
+class MPGSummary():
+    def __init__(self, k= 200, precision= 12, epsilon= 0.01, delta= 0.01, top= 32, seed= None):
+        """Streaming per-year and per-make aggregates in memory bounded by the number of years and makes, not rows.
+
+        Keeps an exact mpg sum and count plus a KLLSketch of mpg for each year and make, a HyperLogLog of the models of
+        each make and a CountMinSketch of makes. Summaries built with the same arguments merge.
+
+        Arguments
+        ---------
+        k: int; optional
+        As for KLLSketch.
+
+        precision: int; optional
+        As for HyperLogLog.
+
+        epsilon, delta, top: optional
+        As for CountMinSketch.
+
+        seed: int; optional
+        A seed for the KLL sketches.
+        """
+        self.options = { 'k': k, 'precision': precision, 'epsilon': epsilon, 'delta': delta, 'top': top, 'seed': seed }
+        self.count = 0
+        ## group -> [mpg sum, count]
+        self.year_totals = {}
+        self.make_totals = {}
+        ## group -> KLLSketch of mpg
+        self.year_mpgs = {}
+        self.make_mpgs = {}
+        ## make -> HyperLogLog of model names
+        self.make_models = {}
+        self.makes = CountMinSketch(epsilon, delta, top)
+
+    def _kll(self):
+        return KLLSketch(self.options['k'], self.options['seed'])
+
+    def update(self, auto):
+        """Adds one AutoMPG object to the summary."""
+        self.count += 1
+        for totals, mpgs, key in [(self.year_totals, self.year_mpgs, auto.year), (self.make_totals, self.make_mpgs, auto.make)]:
+            total = totals.setdefault(key, [0, 0])
+            total[0] += auto.mpg
+            total[1] += 1
+            if key not in mpgs:
+                mpgs[key] = self._kll()
+            mpgs[key].update(auto.mpg)
+        if auto.make not in self.make_models:
+            self.make_models[auto.make] = HyperLogLog(self.options['precision'])
+        self.make_models[auto.make].update(auto.model)
+        self.makes.update(auto.make)
+
+    def merge(self, other):
+        """Folds the summary of another shard into this one and returns self."""
+        if other.options != self.options:
+            raise ValueError('Cannot merge summaries built with different options')
+        self.count += other.count
+        for totals, other_totals in [(self.year_totals, other.year_totals), (self.make_totals, other.make_totals)]:
+            for key, (mpg_sum, count) in other_totals.items():
+                total = totals.setdefault(key, [0, 0])
+                total[0] += mpg_sum
+                total[1] += count
+        for mpgs, other_mpgs in [(self.year_mpgs, other.year_mpgs), (self.make_mpgs, other.make_mpgs)]:
+            for key, sketch in other_mpgs.items():
+                mpgs.setdefault(key, self._kll()).merge(sketch)
+        for make, sketch in other.make_models.items():
+            self.make_models.setdefault(make, HyperLogLog(self.options['precision'])).merge(sketch)
+        self.makes.merge(other.makes)
+        return self
+
+    def mpg_by_year(self):
+        """Returns a dictionary of year to exact average mpg."""
+        return { year: mpg_sum / count for year, (mpg_sum, count) in self.year_totals.items() }
+
+    def mpg_by_make(self):
+        """Returns a dictionary of make to exact average mpg."""
+        return { make: mpg_sum / count for make, (mpg_sum, count) in self.make_totals.items() }
+
+    def quantiles_by_year(self, qs= (0.5,)):
+        """Returns a dictionary of year to the estimated mpg quantile for each q in qs."""
+        return { year: sketch.quantiles(qs) for year, sketch in self.year_mpgs.items() }
+
+    def quantiles_by_make(self, qs= (0.5,)):
+        """Returns a dictionary of make to the estimated mpg quantile for each q in qs."""
+        return { make: sketch.quantiles(qs) for make, sketch in self.make_mpgs.items() }
+
+    def models_by_make(self):
+        """Returns a dictionary of make to its estimated number of distinct models."""
+        return { make: sketch.count() for make, sketch in self.make_models.items() }
+
+    def top_makes(self, phi= 0.05):
+        """Returns (make, estimated count) for makes estimated above phi of all cars, heaviest first."""
+        return self.makes.heavy_hitters(phi)
@@ -0,0 +1,193 @@
+"""Persistent SQLite storage for parsed auto-mpg records.
+
+Records are bulk-loaded once with executemany inside a single transaction; afterwards the aggregates, sort orders and
+filters AutoMPGData offers are answered as SQL straight from the database file, without re-parsing any text.
+
+Each index leads with make, year or mpg and continues with the rest of that sort order's key, so lookups on the
+leading column, the matching ORDER BY (rowid breaks ties in load order, like a stable sort) and the per-group averages
+are all served from an index.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+import os
+import sqlite3
+
+## column name -> SQLite type, in AutoMPG constructor order
+COLUMNS = {
+    'make': 'TEXT NOT NULL',
+    'model': 'TEXT NOT NULL',
+    'year': 'INTEGER NOT NULL',
+    'mpg': 'REAL NOT NULL',
+    'cylinders': 'REAL',
+    'displacement': 'REAL',
+    'horsepower': 'REAL',
+    'weight': 'REAL',
+    'acceleration': 'REAL',
+    'origin': 'REAL'
+}
+
+## what select() yields unless the store is given another factory
+Row = namedtuple('Row', list(COLUMNS))
+
+## sort order -> ORDER BY clause, matching autompg3.SORT_KEYS
+ORDERS = {
+    'default': 'make, model, year, mpg, id',
+    'year': 'year, make, model, mpg, id',
+    'mpg': 'mpg, make, model, year, id'
+}
+
+INDEXES = {
+    'autos_make': 'make, model, year, mpg',
+    'autos_year': 'year, make, model, mpg',
+    'autos_mpg': 'mpg, make, model, year'
+}
+
+class AutoMPGStore():
+    def __init__(self, db_path= 'auto-mpg.db', factory= Row):
+        """Opens (creating if needed) an auto-mpg database.
+
+        Arguments
+        ---------
+        db_path: str; optional
+        The SQLite database file; ':memory:' keeps it in memory.
+
+        factory: callable; optional
+        Builds each record select() yields from the column values in COLUMNS order, e.g. autompg3.AutoMPG.
+        """
+        self.db_path = db_path
+        self.factory = factory
+        ## transactions are managed explicitly; the sqlite3 module's implicit BEGIN is only issued before DML, so DDL
+        ## such as DROP INDEX would otherwise commit on its own
+        self.connection = sqlite3.connect(db_path, isolation_level= None)
+        with self._transaction():
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS autos (id INTEGER PRIMARY KEY, '
+                f'{", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())})')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self._create_indexes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        """Iterates over the stored records in load order."""
+        return self.select()
+
+    def __len__(self):
+        """Returns the number of stored records."""
+        return self.connection.execute('SELECT COUNT(*) FROM autos').fetchone()[0]
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Runs the body in one transaction, committed if it finishes and rolled back if it raises."""
+        self.connection.execute('BEGIN')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def _create_indexes(self):
+        """Creates any of INDEXES that are missing."""
+        for name, columns in INDEXES.items():
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON autos ({columns})')
+
+    def load(self, autos, source= None):
+        """Replaces the stored records with autos in one transaction and returns the number loaded.
+
+        Indexes are dropped for the insert and rebuilt once at the end, which is much cheaper than maintaining them
+        row by row. If autos raises part way through, everything is rolled back, indexes included.
+
+        Arguments
+        ---------
+        autos: iterable; required
+        AutoMPG objects, e.g. an AutoMPGData or its _read_autos() stream.
+
+        source: str; optional
+        The file the records came from; its modification time is recorded so is_current() can spot a stale database.
+        """
+        rows = ((auto.make, auto.model, auto.year, auto.mpg, auto.cylinders, auto.displacement, auto.horsepower,
+                 auto.weight, auto.acceleration, auto.origin) for auto in autos)
+        with self._transaction():
+            for name in INDEXES:
+                self.connection.execute(f'DROP INDEX IF EXISTS {name}')
+            self.connection.execute('DELETE FROM autos')
+            self.connection.executemany(
+                f'INSERT INTO autos ({", ".join(COLUMNS)}) VALUES ({", ".join("?" for _ in COLUMNS)})', rows)
+            self._create_indexes()
+            self.connection.execute('DELETE FROM meta')
+            if source is not None:
+                self.connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+                    ('source', os.path.abspath(source)), ('mtime', repr(os.path.getmtime(source)))
+                ])
+        self.connection.execute('ANALYZE')
+        return len(self)
+
+    def is_current(self, source):
+        """Returns whether the database was loaded from source and source has not changed since."""
+        meta = dict(self.connection.execute('SELECT key, value FROM meta'))
+        return (meta.get('source') == os.path.abspath(source) and os.path.exists(source)
+                and meta.get('mtime') == repr(os.path.getmtime(source)))
+
+    def mpg_by_year(self):
+        """Returns a dictionary of year to average mpg."""
+        return dict(self.connection.execute('SELECT year, AVG(mpg) FROM autos GROUP BY year'))
+
+    def mpg_by_make(self):
+        """Returns a dictionary of make to average mpg."""
+        return dict(self.connection.execute('SELECT make, AVG(mpg) FROM autos GROUP BY make'))
+
+    def select(self, order= None, **conditions):
+        """Yields the stored records, optionally filtered and sorted, built with the store's factory.
+
+        Arguments
+        ---------
+        order: str; optional
+        One of 'default', 'year' or 'mpg'; otherwise records come back in load order.
+
+        conditions: optional
+        Column name -> value for equality, or -> (low, high) for an inclusive range where either end may be None,
+        e.g. make= 'ford', year= (1975, None).
+        """
+        clauses = []
+        params = []
+        for name, value in conditions.items():
+            if name not in COLUMNS:
+                raise ValueError(f'Unknown column: {name}')
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    clauses.append(f'{name} >= ?')
+                    params.append(low)
+                if high is not None:
+                    clauses.append(f'{name} <= ?')
+                    params.append(high)
+            else:
+                clauses.append(f'{name} = ?')
+                params.append(value)
+        sql = f'SELECT {", ".join(COLUMNS)} FROM autos'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ' + (ORDERS[order] if order else 'id')
+        for row in self.connection.execute(sql, params):
+            yield self.factory(*row)
+
+    def sort_by_default(self):
+        """Yields the records by make, model, year, then mpg."""
+        return self.select('default')
+
+    def sort_by_year(self):
+        """Yields the records by year first."""
+        return self.select('year')
+
+    def sort_by_mpg(self):
+        """Yields the records by mpg first."""
+        return self.select('mpg')
@@ -0,0 +1,376 @@
+"""Differential performance regression harness for the AutoMPGData implementations.
+
+Runs the same synthetic workload against week6/autompg.py, week7/autompg2.py, week8/autompg3.py and the week8 backends
+(external sort and streamed sketches, SQLite). It checks that every implementation produces the same output for each
+operation it supports, and records the best wall time and peak traced memory of each. With a saved baseline, any
+operation slower than threshold x its baseline time is flagged.
+
+    python regression.py --rows 20000 --save baseline.json
+    python regression.py --rows 20000 --baseline baseline.json
+
+Outputs are compared after normalizing away known representation differences: week6/week7 wrap make and model in
+single quotes. The synthetic makes are all spelled correctly, so week8's make corrections do not come into play.
+Peak memory is what tracemalloc sees, so allocations inside SQLite itself are not counted.
+
+To add a backend, add an entry to IMPLEMENTATIONS returning a dictionary of operation name -> Op.
+"""
+import argparse
+from collections import namedtuple
+import contextlib
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+## the workload, in the order it runs
+OPERATIONS = ['clean', 'load', 'sort_default', 'sort_year', 'sort_mpg', 'mpg_by_year', 'mpg_by_make', 'hash']
+
+## one operation: setup() builds untimed state, run(state) is timed and returns the output to compare
+Op = namedtuple('Op', ['setup', 'run'])
+
+## one measurement: best time over the repeats, peak traced bytes of one run and the normalized output
+Result = namedtuple('Result', ['implementation', 'operation', 'seconds', 'peak_bytes', 'output'])
+
+## everything run() found: the results, (implementation, operation) pairs whose output differs from the first
+## implementation's, and (implementation, operation, seconds, baseline seconds) for operations that got slower
+Report = namedtuple('Report', ['results', 'mismatches', 'slowdowns'])
+
+## make -> models for the synthetic data; an empty model is a one-word car name, like 'subaru'
+MAKES = {
+    'amc': ['hornet', 'gremlin', 'matador', 'ambassador dpl'],
+    'buick': ['skylark 320', 'estate wagon (sw)', 'century'],
+    'chevrolet': ['chevelle malibu', 'impala', 'vega', 'monte carlo'],
+    'datsun': ['pl510', '510', 'b210'],
+    'ford': ['torino', 'pinto', 'galaxie 500', 'mustang ii'],
+    'honda': ['civic', 'accord'],
+    'plymouth': ['fury iii', 'duster', 'satellite'],
+    'subaru': [''],
+    'toyota': ['corolla', 'corona mark ii', 'celica gt'],
+    'volkswagen': ['rabbit', 'dasher', 'super beetle']
+}
+
+def make_dataset(path, rows= 20000, seed= 0):
+    """Writes a synthetic auto-mpg.data.txt in the UCI layout.
+
+    Arguments
+    ---------
+    path: str; required
+    The file to write.
+
+    rows: int; optional
+    The number of cars.
+
+    seed: int; optional
+    A seed for reproducible data.
+    """
+    rng = random.Random(seed)
+    makes = sorted(MAKES)
+    with open(path, 'w') as f:
+        for _ in range(rows):
+            make = rng.choice(makes)
+            name = f'{make} {rng.choice(MAKES[make])}'.strip()
+            cylinders = rng.choice([4, 6, 8])
+            horsepower = '?' if rng.random() < 0.01 else f'{rng.randint(46, 230)}.0'
+            f.write(f'{rng.randint(90, 460) / 10:.1f}   {cylinders}   {rng.uniform(68, 455):.1f}      {horsepower}      '
+                    f'{rng.randint(1613, 5140)}.      {rng.uniform(8, 25):.1f}   {rng.randint(70, 82)}  {rng.randint(1, 3)}'
+                    f'\t"{name}"\n')
+
+def _strip(value):
+    """Removes the single quotes week6/week7 put around names."""
+    return value.strip("'") if isinstance(value, str) else value
+
+def _records(autos):
+    return [(_strip(auto.make), _strip(auto.model), auto.year, auto.mpg) for auto in autos]
+
+def _averages(aggregate):
+    ## SQLite and Python may differ in the last bits of a sum
+    return { _strip(key): round(value, 6) for key, value in aggregate.items() }
+
+def _hashing(output):
+    distinct, equal = output
+    return sorted(_records(distinct)), equal
+
+def _file_digest(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+## operation -> function turning its raw output into something comparable across implementations
+NORMALIZERS = {
+    'clean': _file_digest,
+    'load': _records,
+    'sort_default': _records,
+    'sort_year': _records,
+    'sort_mpg': _records,
+    'mpg_by_year': _averages,
+    'mpg_by_make': _averages,
+    'hash': _hashing
+}
+
+def _import(week, name):
+    """Imports one of the weekly modules by path, so modules from different weeks can be loaded side by side."""
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, week, f'{name}.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return sys.modules[name]
+
+def _in_memory(module):
+    """Returns the operations an AutoMPGData class that loads everything into its data attribute supports."""
+    data_class = module.AutoMPGData
+
+    def _unloaded():
+        return data_class.__new__(data_class)
+
+    def _clean(data):
+        data._clean_data()
+        return 'auto-mpg.clean.txt'
+
+    def _hash(data):
+        ## hash every object into a set and compare each with its neighbour
+        return set(data.data), sum(1 for a, b in zip(data.data, data.data[1:]) if a == b)
+
+    def _sort(order):
+        def _run(data):
+            getattr(data, f'sort_by_{order}')()
+            return data.data
+        return _run
+
+    def _aggregate(name):
+        return lambda data: getattr(data, name)()
+
+    ops = {
+        'clean': Op(_unloaded, _clean),
+        'load': Op(lambda: None, lambda _: data_class()),
+        'hash': Op(data_class, _hash)
+    }
+    for order in ['default', 'year', 'mpg']:
+        if hasattr(data_class, f'sort_by_{order}'):
+            ops[f'sort_{order}'] = Op(data_class, _sort(order))
+    for name in ['mpg_by_year', 'mpg_by_make']:
+        if hasattr(data_class, name):
+            ops[name] = Op(data_class, _aggregate(name))
+    return ops
+
+def _external(memory_budget= 64 * 1024):
+    """Returns week8's streaming operations: on-disk sorts and sketch summaries that never load the dataset."""
+    autompg3 = _import('week8', 'autompg3')
+
+    def _streamed():
+        return autompg3.AutoMPGData(load= False)
+
+    def _sort(order):
+        return lambda data: list(data.export_sorted(order, memory_budget))
+
+    return {
+        'sort_default': Op(_streamed, _sort('default')),
+        'sort_year': Op(_streamed, _sort('year')),
+        'sort_mpg': Op(_streamed, _sort('mpg')),
+        'mpg_by_year': Op(_streamed, lambda data: data.summarize(stream= True).mpg_by_year()),
+        'mpg_by_make': Op(_streamed, lambda data: data.summarize(stream= True).mpg_by_make())
+    }
+
+def _sqlite(db_path= 'auto-mpg.db'):
+    """Returns week8's SQLite operations; load is the bulk load, everything else queries the loaded database."""
+    autompg3 = _import('week8', 'autompg3')
+
+    def _store():
+        store = autompg3.AutoMPGStore(db_path, autompg3.AutoMPG)
+        if not store.is_current('auto-mpg.clean.txt'):
+            store.close()
+            store = autompg3.AutoMPGData(load= False).to_sqlite(db_path, stream= True)
+        return store
+
+    def _sort(order):
+        return lambda store: list(store.select(order))
+
+    return {
+        'load': Op(lambda: autompg3.AutoMPGData(load= False), lambda data: data.to_sqlite(db_path, stream= True)),
+        'sort_default': Op(_store, _sort('default')),
+        'sort_year': Op(_store, _sort('year')),
+        'sort_mpg': Op(_store, _sort('mpg')),
+        'mpg_by_year': Op(_store, lambda store: store.mpg_by_year()),
+        'mpg_by_make': Op(_store, lambda store: store.mpg_by_make())
+    }
+
+## implementation name -> function returning its operations; the first to support an operation is the reference
+IMPLEMENTATIONS = {
+    'week6': lambda: _in_memory(_import('week6', 'autompg')),
+    'week7': lambda: _in_memory(_import('week7', 'autompg2')),
+    'week8': lambda: _in_memory(_import('week8', 'autompg3')),
+    'week8-external': _external,
+    'week8-sqlite': _sqlite
+}
+
+def _measure(op, repeat):
+    """Returns (best seconds, peak traced bytes, raw output) for one operation."""
+    best = None
+    for _ in range(repeat):
+        state = op.setup()
+        start = time.perf_counter()
+        output = op.run(state)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    ## a separate run for memory, since tracing slows everything down
+    state = op.setup()
+    tracemalloc.start()
+    try:
+        output = op.run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, output
+
+def compare(results, baseline, threshold= 1.25):
+    """Returns (implementation, operation, seconds, baseline seconds) for each result slower than threshold x its
+    baseline.
+
+    Arguments
+    ---------
+    results: list; required
+    Results from run().
+
+    baseline: dict; required
+    A dictionary as written by save(): implementation -> operation -> {'seconds', 'peak_bytes'}.
+
+    threshold: float; optional
+    The slowdown factor that is flagged.
+    """
+    slowdowns = []
+    for result in results:
+        previous = baseline.get(result.implementation, {}).get(result.operation)
+        if previous and result.seconds > threshold * previous['seconds']:
+            slowdowns.append((result.implementation, result.operation, result.seconds, previous['seconds']))
+    return slowdowns
+
+def save(results, file_path, rows):
+    """Writes the timings and peak memory of results to a JSON baseline file."""
+    baseline = { 'rows': rows, 'results': {} }
+    for result in results:
+        baseline['results'].setdefault(result.implementation, {})[result.operation] = {
+            'seconds': result.seconds, 'peak_bytes': result.peak_bytes
+        }
+    with open(file_path, 'w') as f:
+        json.dump(baseline, f, indent= 2)
+
+def load_baseline(file_path, rows):
+    """Reads a baseline written by save(); raises ValueError if it was recorded with a different number of rows."""
+    with open(file_path) as f:
+        baseline = json.load(f)
+    if baseline['rows'] != rows:
+        raise ValueError(f'{file_path} was recorded with {baseline["rows"]} rows, not {rows}')
+    return baseline['results']
+
+def run(rows= 20000, seed= 0, repeat= 3, implementations= None, operations= None, baseline= None, threshold= 1.25):
+    """Runs the workload against every implementation in a scratch directory and returns a Report.
+
+    Arguments
+    ---------
+    rows: int; optional
+    The number of synthetic cars.
+
+    seed: int; optional
+    A seed for the synthetic data.
+
+    repeat: int; optional
+    The number of timed runs per operation; the best is kept.
+
+    implementations: list; optional
+    Names from IMPLEMENTATIONS to run; defaults to all of them.
+
+    operations: list; optional
+    Names from OPERATIONS to run; defaults to all of them.
+
+    baseline: dict; optional
+    Results from load_baseline() to flag slowdowns against.
+
+    threshold: float; optional
+    The slowdown factor that is flagged.
+    """
+    implementations = implementations or list(IMPLEMENTATIONS)
+    operations = [op for op in OPERATIONS if op in (operations or OPERATIONS)]
+    results = []
+    references = {}
+    mismatches = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        ## every implementation reads and writes its files in the working directory
+        os.chdir(tmp)
+        try:
+            make_dataset('auto-mpg.data.txt', rows, seed)
+            ## week6 prints every record it parses
+            with contextlib.redirect_stdout(devnull):
+                for name in implementations:
+                    try:
+                        ops = IMPLEMENTATIONS[name]()
+                    except ImportError as e:
+                        ## e.g. week7 needs requests
+                        print(f'Skipping {name}: {e}', file= sys.stderr)
+                        continue
+                    for operation in operations:
+                        if operation not in ops:
+                            continue
+                        seconds, peak, output = _measure(ops[operation], repeat)
+                        output = NORMALIZERS[operation](output)
+                        results.append(Result(name, operation, seconds, peak, output))
+                        if operation not in references:
+                            references[operation] = output
+                        elif output != references[operation]:
+                            mismatches.append((name, operation))
+        finally:
+            os.chdir(cwd)
+    slowdowns = compare(results, baseline, threshold) if baseline else []
+    return Report(results, mismatches, slowdowns)
+
+def main():
+    ## handle argparse setup
+    parser = argparse.ArgumentParser(description= 'Compare the AutoMPGData implementations on a synthetic workload')
+    parser.add_argument('-r', '--rows', metavar= '<rows>', type= int, default= 20000)
+    parser.add_argument('--seed', metavar= '<seed>', type= int, default= 0)
+    parser.add_argument('--repeat', metavar= '<count>', type= int, default= 3)
+    parser.add_argument('-i', '--implementation', metavar= '<name>', action= 'append', dest= 'implementations',
+                        choices= list(IMPLEMENTATIONS), help= 'an implementation to run; repeat for several (default all)')
+    parser.add_argument('--op', metavar= '<operation>', action= 'append', dest= 'operations', choices= OPERATIONS,
+                        help= 'an operation to run; repeat for several (default all)')
+    parser.add_argument('-b', '--baseline', metavar= '<file>', type= str, default= None,
+                        help= 'flag operations slower than this saved baseline')
+    parser.add_argument('-t', '--threshold', metavar= '<factor>', type= float, default= 1.25)
+    parser.add_argument('-s', '--save', metavar= '<file>', type= str, default= None, help= 'save the timings as a baseline')
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline, args.rows) if args.baseline else None
+    report = run(args.rows, args.seed, args.repeat, args.implementations, args.operations, baseline, args.threshold)
+
+    ## time relative to the reference (first) implementation of each operation
+    reference_seconds = {}
+    slowdowns = { (name, operation): (seconds, before) for name, operation, seconds, before in report.slowdowns }
+    print(f'{"implementation":<16}{"operation":<14}{"seconds":>10}{"peak KiB":>12}{"vs ref":>9}  status')
+    for result in report.results:
+        reference_seconds.setdefault(result.operation, result.seconds)
+        relative = result.seconds / reference_seconds[result.operation] if reference_seconds[result.operation] else 1
+        status = 'MISMATCH' if (result.implementation, result.operation) in report.mismatches else 'ok'
+        if (result.implementation, result.operation) in slowdowns:
+            seconds, before = slowdowns[(result.implementation, result.operation)]
+            status += f', SLOWER {seconds / before:.2f}x than baseline'
+        print(f'{result.implementation:<16}{result.operation:<14}{result.seconds:>10.4f}'
+              f'{result.peak_bytes / 1024:>12.1f}{relative:>8.2f}x  {status}')
+
+    if args.save:
+        save(report.results, args.save, args.rows)
+    sys.exit(1 if report.mismatches or report.slowdowns else 0)
+
+if __name__ == '__main__':
+    main()
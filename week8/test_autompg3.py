@@ -0,0 +1,290 @@
+"""Unit tests for the autompg program."""
+import bz2
+import gzip
+import lzma
+import os
+import random
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+import zipfile
+
+import autompg3
+from autompg3 import *
+
+class TestAutoMPG(unittest.TestCase):
+
+    def test_init(self):
+        a1 = AutoMPG(1, 2, 3, 4)
+        self.assertEqual("1", a1.make)
+        self.assertEqual("2", a1.model)
+        self.assertEqual(1903, a1.year)
+        self.assertEqual(4.0, a1.mpg)
+        # four digit years are taken as they are
+        self.assertEqual(1982, AutoMPG(1, 2, 1982, 4).year)
+
+    def test_eq(self):
+        # test when they are equal
+        a1 = AutoMPG('a', 'b', 3, 4)
+        a2 = AutoMPG('a', 'b', 3, 4)
+        self.assertTrue(a1 == a2)
+        self.assertFalse(a1 != a2)
+
+        # test each attribute
+        a2 = AutoMPG('c', 'b', 3, 4)
+        self.assertTrue(a1 != a2)
+        self.assertFalse(a1 == a2)
+
+        a2 = AutoMPG('a', 'c', 3, 4)
+        self.assertTrue(a1 != a2)
+        self.assertFalse(a1 == a2)
+        
+        a2 = AutoMPG('a', 'b', 0, 4)
+        self.assertTrue(a1 != a2)
+        self.assertFalse(a1 == a2)
+        
+        a2 = AutoMPG('a', 'b', 3, 0)
+        self.assertTrue(a1 != a2)
+        self.assertFalse(a1 == a2)
+        
+    def test_hash(self):
+        a1 = AutoMPG('a', 'b', 3, 4)
+        a2 = AutoMPG('a', 'b', 3, 4)
+
+        # sets will only have unique values - determined by hash
+        s = {a1, a2}
+        self.assertEqual(1, len(s))
+        self.assertTrue(a1 in s)
+        self.assertTrue(a2 in s)
+
+        # now make sure each attribute is considered in the
+        # has function
+        b1 = AutoMPG('c', 'b', 3, 4)
+        s.add(b1)
+        self.assertEqual(2, len(s))
+        self.assertTrue(b1 in s)
+                
+        b1 = AutoMPG('a', 'c', 3, 4)
+        s.add(b1)
+        self.assertEqual(3, len(s))
+        self.assertTrue(b1 in s)
+                
+        b1 = AutoMPG('a', 'b', 0, 4)
+        s.add(b1)
+        self.assertEqual(4, len(s))
+        self.assertTrue(b1 in s)
+
+        b1 = AutoMPG('a', 'b', 3, 0)
+        s.add(b1)
+        self.assertEqual(5, len(s))
+        self.assertTrue(b1 in s)
+                
+    @unittest.expectedFailure
+    def test_lt_wrong_type(self):
+        a1 = AutoMPG('a', 'b', 3, 4)
+        a1 < "should not work"
+
+    def test_lt_mpg(self):
+        a1 = AutoMPG('a', 'b', 3, 4)
+        a2 = AutoMPG('a', 'b', 3, 5)
+        self.assertTrue(a1 < a2)
+        self.assertFalse(a2 < a1)
+
+    def test_lt_year(self):
+        a1 = AutoMPG('a', 'b', 3, 0)
+        a2 = AutoMPG('a', 'b', 4, 0)
+        self.assertTrue(a1 < a2)
+        self.assertFalse(a2 < a1)
+
+    def test_lt_model(self):
+        # make, model, year are the only ones that matter
+        a1 = AutoMPG('a', 'b', 0, 0)
+        a2 = AutoMPG('a', 'c', 0, 0)
+        self.assertTrue(a1 < a2)
+        self.assertFalse(a2 < a1)
+
+    def test_lt_make(self):
+        # make, model, year are the only ones that matter
+        a1 = AutoMPG('a', 'c', 0, 0)
+        a2 = AutoMPG('b', 'c', 0, 0)
+        self.assertTrue(a1 < a2)
+        self.assertFalse(a2 < a1)
+
+class TestAutoMPGData(unittest.TestCase):
+
+    def test_iterable(self):
+        # make sure it is possible to get and iterator from AutoMPGData
+        iter(AutoMPGData())
+
+    @unittest.skipIf(np is None, 'numpy not installed')
+    def test_all_columns_loaded(self):
+        # every numeric column is exported, in step with the AutoMPG objects
+        autos = AutoMPGData()
+        for name in NUMERIC_COLUMNS:
+            self.assertEqual(len(autos.data), len(autos.to_numpy(name)))
+        self.assertEqual(autos.data[0].weight, autos.to_numpy('weight')[0])
+
+    def test_missing_horsepower(self):
+        a1 = AutoMPG('a', 'b', 3, 4, horsepower= '?')
+        self.assertIsNone(a1.horsepower)
+
+    @unittest.skipIf(np is None, 'numpy not installed')
+    def test_columns_follow_data(self):
+        autos = AutoMPGData()
+        autos.sort_by_mpg()
+        self.assertEqual([a.mpg for a in autos], list(autos.to_numpy('mpg')))
+        # the data attribute is public; reordering or extending it directly must not leave stale columns behind
+        autos.data.sort(key= lambda x: (x.weight, x.make))
+        self.assertEqual([a.mpg for a in autos], list(autos.to_numpy('mpg')))
+        autos.data.extend(autos.data[:5])
+        self.assertEqual([a.weight for a in autos], list(autos.to_numpy('weight')))
+        autos.data[0] = autos.data[-1]
+        self.assertEqual([a.year for a in autos], list(autos.to_numpy('year')))
+
+    @unittest.skipIf(np is None, 'numpy not installed')
+    def test_to_numpy_read_only(self):
+        autos = AutoMPGData()
+        mpg = autos.to_numpy('mpg')
+        with self.assertRaises(ValueError):
+            mpg[0] = -1
+        self.assertEqual(autos.data[0].mpg, autos.to_numpy('mpg')[0])
+
+    @unittest.skipIf(np is None, 'numpy not installed')
+    def test_to_numpy(self):
+        autos = AutoMPGData()
+        horsepower = autos.to_numpy('horsepower')
+        self.assertEqual(len(autos.data), len(horsepower))
+        self.assertEqual(sum(a.horsepower is None for a in autos), int(np.isnan(horsepower).sum()))
+        self.assertEqual((len(autos.data), 2), autos.to_numpy(['mpg', 'weight']).shape)
+
+    @unittest.skipIf(pa is None or np is None, 'pyarrow not installed')
+    def test_to_arrow(self):
+        autos = AutoMPGData()
+        table = autos.to_arrow()
+        self.assertEqual(len(autos.data), table.num_rows)
+        self.assertEqual(sum(a.horsepower is None for a in autos), table.column('horsepower').null_count)
+
+    def test_dedupe(self):
+        autos = AutoMPGData()
+        n = len(autos.data)
+        autos.data.extend(autos.data[:10])
+        self.assertEqual(10, autos.dedupe())
+        self.assertEqual(n, len(autos.data))
+        hashed = list(autos.data)
+
+        # sort-based dedupe keeps the same rows in the same order
+        autos.data.extend(autos.data[:10])
+        self.assertEqual(10, autos.dedupe(method= 'sort'))
+        self.assertEqual(hashed, autos.data)
+
+        # both keep the first occurrence, wherever the duplicate sits
+        for method in ['hash', 'sort']:
+            autos = AutoMPGData()
+            first = list(autos.data)
+            autos.data.insert(0, autos.data[-1])
+            autos.dedupe(method= method)
+            self.assertEqual([first[-1]] + first[:-1], autos.data)
+
+        # on fields with missing values, spilling to disk, and with 'auto' switching to the sort above HASH_LIMIT
+        results = []
+        for method, limit in [('hash', HASH_LIMIT), ('sort', HASH_LIMIT), ('auto', HASH_LIMIT), ('auto', 10)]:
+            autos = AutoMPGData()
+            with mock.patch.object(autompg3, 'HASH_LIMIT', limit), \
+                 mock.patch.object(autompg3, 'external_sort', wraps= external_sort) as spill:
+                removed = autos.dedupe(on= ['cylinders', 'horsepower'], method= method, memory_budget= 20000)
+            self.assertEqual(method == 'sort' or limit == 10, spill.called)
+            results.append((removed, autos.data))
+        self.assertGreater(results[0][0], 0)
+        self.assertEqual([results[0]] * 4, results)
+
+    def test_join(self):
+        autos = AutoMPGData()
+        table = [
+            { 'make': 'ford', 'model': 'pinto', 'year': 1971, 'price': 1 },
+            { 'make': 'nobody', 'model': 'nothing', 'year': 1900, 'price': 2 }
+        ]
+        pinto = [a for a in autos if (a.make, a.model, a.year) == ('ford', 'pinto', 1971)]
+        for method in ['hash', 'merge']:
+            inner = autos.join(table, how= 'inner', method= method)
+            self.assertEqual(len(pinto), len(inner))
+            self.assertTrue(all(r['price'] == 1 for _, r in inner))
+            self.assertEqual(len(autos.data), len(autos.join(table, how= 'left', method= method)))
+            self.assertEqual(len(pinto) + 1, len(autos.join(table, how= 'right', method= method)))
+            self.assertEqual(len(autos.data) + 1, len(autos.join(table, how= 'outer', method= method)))
+        # every method gives the same pairs in the same order, including many-to-many matches on missing values
+        other = autos.data[::-1] + [{ 'cylinders': 5.0, 'horsepower': 1.0 }]
+        for how in ['inner', 'left', 'right', 'outer']:
+            hashed = autos.join(other, on= ['cylinders', 'horsepower'], how= how, method= 'hash')
+            self.assertEqual(hashed, autos.join(other, on= ['cylinders', 'horsepower'], how= how, method= 'merge',
+                                                memory_budget= 20000))
+            with mock.patch.object(autompg3, 'HASH_LIMIT', 10):
+                self.assertEqual(hashed, autos.join(other, on= ['cylinders', 'horsepower'], how= how))
+        # pairs follow the data attribute
+        self.assertEqual(autos.data, [auto for auto, _ in autos.join(autos.data[::-1], on= ['make', 'model', 'year', 'mpg'], method= 'merge')])
+
+    def test_external_sort(self):
+        # spilling to disk must give exactly the in-memory ordering
+        for order in ['default', 'year', 'mpg']:
+            in_memory = list(AutoMPGData().export_sorted(order))
+            on_disk = list(AutoMPGData(load= False).export_sorted(order, memory_budget= 10000))
+            self.assertEqual(in_memory, on_disk)
+
+    def test_external_sort_memory(self):
+        # the merge, not just run generation, stays within the budget
+        def autos(n):
+            rng = random.Random(1)
+            for _ in range(n):
+                yield AutoMPG(rng.choice(['ford', 'chevrolet', 'toyota']), f'model {rng.randrange(500)}',
+                              rng.randrange(70, 83), rng.uniform(9, 47), 4, 120, 95, 2500, 15.5, 1)
+        key = SORT_KEYS['mpg']
+        for budget in [256 * 1024, 1024 * 1024]:
+            tracemalloc.start()
+            try:
+                count, previous = 0, None
+                for auto in external_sort(autos(20000), key, budget):
+                    self.assertTrue(previous is None or key(previous) <= key(auto))
+                    count, previous = count + 1, auto
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(20000, count)
+            self.assertLess(peak, 1.5 * budget)
+
+    def test_compressed_sources(self):
+        # every supported compression streams the same records as the plain file
+        expected = AutoMPGData().data
+        with open('auto-mpg.data.txt', 'rb') as f:
+            raw = f.read()
+        with tempfile.TemporaryDirectory() as tmp:
+            for suffix, opener in [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)]:
+                source = os.path.join(tmp, 'auto-mpg.data' + suffix)
+                with opener(source, 'wb') as f:
+                    f.write(raw)
+                self.assertEqual(expected, AutoMPGData(source= source).data)
+            source = os.path.join(tmp, 'Archive.zip')
+            with zipfile.ZipFile(source, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('auto-mpg.names', 'not data')
+                archive.writestr('auto-mpg.data.txt', raw)
+            self.assertEqual(expected, AutoMPGData(source= source).data)
+            # nothing was extracted next to the archives
+            self.assertEqual(4, len(os.listdir(tmp)))
+
+    def test_summarize(self):
+        # the streamed summary agrees with the in-memory aggregates
+        autos = AutoMPGData()
+        summary = AutoMPGData(load= False).summarize(stream= True)
+        self.assertEqual(len(autos.data), summary.count)
+        self.assertEqual(dict(autos.mpg_by_year()), summary.mpg_by_year())
+        self.assertEqual(dict(autos.mpg_by_make()), summary.mpg_by_make())
+        # small groups stay exact
+        for make, (median,) in summary.quantiles_by_make().items():
+            mpgs = sorted(auto.mpg for auto in autos if auto.make == make)
+            self.assertEqual(mpgs[(len(mpgs) - 1) // 2], median)
+        for make, models in summary.models_by_make().items():
+            self.assertEqual(len({ auto.model for auto in autos if auto.make == make }), models)
+        self.assertEqual('ford', summary.top_makes()[0][0])
+
+if __name__ == '__main__':
+    unittest.main()
+
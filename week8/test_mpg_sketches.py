@@ -0,0 +1,132 @@
+"""Unit tests for the mpg_sketches module."""
+import pickle
+import random
+import unittest
+
+from mpg_sketches import *
+
+class TestKLLSketch(unittest.TestCase):
+
+    def test_exact_when_small(self):
+        sketch = KLLSketch()
+        for value in range(100):
+            sketch.update(value)
+        self.assertEqual([0, 49, 99], sketch.quantiles([0, 0.5, 1]))
+        self.assertEqual(0.5, sketch.rank(49))
+
+    def test_rank_error(self):
+        rng = random.Random(0)
+        values = [rng.gauss(25, 8) for _ in range(100000)]
+        sketch = KLLSketch(seed= 0)
+        for value in values:
+            sketch.update(value)
+        ordered = sorted(values)
+        for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+            true_rank = ordered.index(sketch.quantile(q)) / len(ordered)
+            self.assertLess(abs(true_rank - q), 0.0165)
+        # fixed memory: fewer than 3k values (plus one per level) retained
+        retained = sum(len(c) for c in sketch.compactors)
+        self.assertLess(retained, 3 * sketch.k + len(sketch.compactors))
+
+    def test_merge(self):
+        rng = random.Random(1)
+        values = [rng.random() for _ in range(50000)]
+        shards = [KLLSketch(seed= i) for i in range(4)]
+        for i, value in enumerate(values):
+            shards[i % 4].update(value)
+        merged = shards[0]
+        for shard in shards[1:]:
+            merged.merge(shard)
+        self.assertEqual(len(values), len(merged))
+        self.assertEqual((min(values), max(values)), (merged.min, merged.max))
+        self.assertAlmostEqual(0.5, merged.quantile(0.5), delta= 0.0165)
+
+    def test_empty(self):
+        self.assertEqual([None, None], KLLSketch().quantiles([0.5, 0.9]))
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_small_counts_exact(self):
+        sketch = HyperLogLog()
+        for value in ['a', 'b', 'c', 'a', 'b']:
+            sketch.update(value)
+        self.assertEqual(3, sketch.count())
+
+    def test_error(self):
+        sketch = HyperLogLog()
+        for value in range(200000):
+            sketch.update(value)
+        # 1.6% standard error; allow three standard errors
+        self.assertAlmostEqual(200000, sketch.count(), delta= 200000 * 0.05)
+        self.assertEqual(4096, len(sketch.registers))
+
+    def test_merge(self):
+        a, b, whole = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for value in range(30000):
+            (a if value % 2 else b).update(value)
+            whole.update(value)
+        # overlapping values are only counted once
+        for value in range(1000):
+            a.update(value)
+        self.assertEqual(whole.count(), a.merge(b).count())
+
+    def test_merge_precision(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(10).merge(HyperLogLog(12))
+
+class TestCountMinSketch(unittest.TestCase):
+
+    def test_estimates(self):
+        rng = random.Random(2)
+        keys = [f'make{int(rng.paretovariate(1))}' for _ in range(20000)]
+        sketch = CountMinSketch()
+        for key in keys:
+            sketch.update(key)
+        for key in set(keys):
+            true = keys.count(key) if key in ('make1', 'make2', 'make3') else None
+            if true is not None:
+                self.assertGreaterEqual(sketch.estimate(key), true)
+                self.assertLessEqual(sketch.estimate(key), true + 0.01 * len(keys))
+        self.assertEqual('make1', sketch.heavy_hitters(0.1)[0][0])
+        self.assertLessEqual(len(sketch.candidates), sketch.top)
+
+    def test_merge(self):
+        a, b, whole = CountMinSketch(), CountMinSketch(), CountMinSketch()
+        for i in range(3000):
+            key = 'ford' if i % 3 == 0 else f'make{i}'
+            (a if i % 2 else b).update(key)
+            whole.update(key)
+        a.merge(b)
+        self.assertEqual(whole.table, a.table)
+        self.assertEqual([('ford', whole.estimate('ford'))], a.heavy_hitters(0.2))
+
+class TestMPGSummary(unittest.TestCase):
+
+    class Auto():
+        def __init__(self, make, model, year, mpg):
+            self.make, self.model, self.year, self.mpg = make, model, year, mpg
+
+    def test_shards_merge(self):
+        rng = random.Random(3)
+        autos = [self.Auto(rng.choice(['ford', 'amc', 'bmw']), f'model{rng.randrange(10)}', rng.randrange(1970, 1983),
+                           rng.uniform(10, 45)) for _ in range(5000)]
+        whole, left, right = MPGSummary(seed= 0), MPGSummary(seed= 0), MPGSummary(seed= 0)
+        for i, auto in enumerate(autos):
+            whole.update(auto)
+            (left if i < 2000 else right).update(auto)
+        # shards survive a round trip through pickle, e.g. from worker processes
+        merged = pickle.loads(pickle.dumps(left)).merge(pickle.loads(pickle.dumps(right)))
+        self.assertEqual(whole.count, merged.count)
+        for make, avg in whole.mpg_by_make().items():
+            self.assertAlmostEqual(avg, merged.mpg_by_make()[make])
+        self.assertEqual(whole.models_by_make(), merged.models_by_make())
+        self.assertEqual({ 'ford': 10, 'amc': 10, 'bmw': 10 }, merged.models_by_make())
+        for year, (median,) in merged.quantiles_by_year().items():
+            self.assertAlmostEqual(whole.quantiles_by_year()[year][0], median, delta= 3)
+
+    def test_merge_options(self):
+        with self.assertRaises(ValueError):
+            MPGSummary(k= 100).merge(MPGSummary(k= 200))
+
+if __name__ == '__main__':
+    unittest.main()
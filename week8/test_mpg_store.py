@@ -0,0 +1,98 @@
+"""Unit tests for the mpg_store module."""
+import os
+import tempfile
+import time
+import unittest
+
+from autompg3 import AutoMPG, AutoMPGData, SORT_KEYS
+from mpg_store import *
+
+class TestAutoMPGStore(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.autos = AutoMPGData()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'auto-mpg.db')
+        self.store = AutoMPGData().to_sqlite(self.db_path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_load(self):
+        self.assertEqual(len(self.autos.data), len(self.store))
+        self.assertEqual(self.autos.data, list(self.store.select()))
+        # every column survives, including missing values
+        stored = list(self.store.select())
+        for name in COLUMNS:
+            self.assertEqual([getattr(a, name) for a in self.autos], [getattr(a, name) for a in stored])
+        # indexes exist for make, year and mpg
+        indexes = { row[0] for row in self.store.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'") }
+        self.assertTrue(set(INDEXES) <= indexes)
+
+    def test_reload_replaces(self):
+        self.store.load(self.autos.data[:10])
+        self.assertEqual(10, len(self.store))
+
+    def test_failed_load_rolls_back(self):
+        def failing():
+            yield from self.autos.data[:10]
+            raise RuntimeError('source went away')
+        meta = list(self.store.connection.execute('SELECT * FROM meta'))
+        with self.assertRaises(RuntimeError):
+            self.store.load(failing())
+        # the old records, indexes and metadata are all still there
+        self.assertEqual(self.autos.data, list(self.store.select()))
+        indexes = { row[0] for row in self.store.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'") }
+        self.assertTrue(set(INDEXES) <= indexes)
+        self.assertEqual(meta, list(self.store.connection.execute('SELECT * FROM meta')))
+        # and the store is usable afterwards
+        self.assertEqual(10, self.store.load(self.autos.data[:10]))
+
+    def test_persistent(self):
+        self.store.close()
+        with AutoMPGStore(self.db_path) as store:
+            self.assertEqual(len(self.autos.data), len(store))
+            # without a factory records come back as Rows
+            self.assertIsInstance(next(store.select()), Row)
+        self.store = AutoMPGStore(self.db_path, AutoMPG)
+
+    def test_aggregates(self):
+        for name in ['mpg_by_year', 'mpg_by_make']:
+            expected = getattr(self.autos, name)()
+            actual = getattr(self.store, name)()
+            self.assertEqual(set(expected), set(actual))
+            for key in expected:
+                self.assertAlmostEqual(expected[key], actual[key])
+
+    def test_sorts(self):
+        # identical to the stable in-memory sorts, ties included
+        for order, key in SORT_KEYS.items():
+            self.assertEqual(sorted(self.autos.data, key= key), list(getattr(self.store, f'sort_by_{order}')()))
+
+    def test_filters(self):
+        fords = [a for a in self.autos if a.make == 'ford' and a.year >= 1975 and 20 <= a.mpg <= 30]
+        self.assertEqual(fords, list(self.store.select(make= 'ford', year= (1975, None), mpg= (20, 30))))
+        self.assertEqual(sorted(fords, key= SORT_KEYS['mpg']),
+                         list(self.store.select('mpg', make= 'ford', year= (1975, None), mpg= (20, 30))))
+        with self.assertRaises(ValueError):
+            list(self.store.select(colour= 'red'))
+
+    def test_is_current(self):
+        self.assertTrue(self.store.is_current('auto-mpg.clean.txt'))
+        self.assertFalse(self.store.is_current('auto-mpg.data.txt'))
+        # a changed source makes the database stale
+        source = os.path.join(self.tmp.name, 'auto-mpg.clean.txt')
+        with open('auto-mpg.clean.txt') as f, open(source, 'w') as out:
+            out.write(f.read())
+        self.store.close()
+        self.store = AutoMPGData(load= False, source= source).to_sqlite(self.db_path, stream= True)
+        self.assertTrue(self.store.is_current(source))
+        os.utime(source, (time.time() + 10, time.time() + 10))
+        self.assertFalse(self.store.is_current(source))
+
+if __name__ == '__main__':
+    unittest.main()
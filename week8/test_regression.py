@@ -0,0 +1,62 @@
+"""Unit tests for the regression harness."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from regression import *
+
+class TestRegression(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.report = run(rows= 500, repeat= 1)
+
+    def test_outputs_match(self):
+        self.assertEqual([], self.report.mismatches)
+        self.assertEqual([], self.report.slowdowns)
+
+    def test_coverage(self):
+        ran = { (result.implementation, result.operation) for result in self.report.results }
+        # every implementation ran, and every operation ran somewhere
+        self.assertEqual(set(IMPLEMENTATIONS), { name for name, _ in ran })
+        self.assertEqual(set(OPERATIONS), { operation for _, operation in ran })
+        # week6 has no sorts or aggregates to compare
+        self.assertEqual({ 'clean', 'load', 'hash' }, { op for name, op in ran if name == 'week6' })
+        for result in self.report.results:
+            self.assertGreater(result.seconds, 0)
+            self.assertGreaterEqual(result.peak_bytes, 0)
+
+    def test_mismatch_flagged(self):
+        # a backend that forgets to sort
+        broken = { 'broken': lambda: { 'sort_mpg': Op(lambda: None, lambda _: []) } }
+        with mock.patch.dict(IMPLEMENTATIONS, broken):
+            report = run(rows= 100, repeat= 1, implementations= ['week8', 'broken'], operations= ['sort_mpg'])
+        self.assertEqual([('broken', 'sort_mpg')], report.mismatches)
+
+    def test_slowdown_flagged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_path = os.path.join(tmp, 'baseline.json')
+            save(self.report.results, baseline_path, 500)
+            baseline = load_baseline(baseline_path, 500)
+            with self.assertRaises(ValueError):
+                load_baseline(baseline_path, 1000)
+        self.assertEqual([], compare(self.report.results, baseline))
+        # pretend everything used to take a tenth of the time
+        for operations in baseline.values():
+            for timing in operations.values():
+                timing['seconds'] /= 10
+        self.assertEqual(len(self.report.results), len(compare(self.report.results, baseline)))
+
+    def test_dataset(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = os.path.join(tmp, 'a'), os.path.join(tmp, 'b')
+            make_dataset(first, rows= 50, seed= 1)
+            make_dataset(second, rows= 50, seed= 1)
+            with open(first) as a, open(second) as b:
+                lines = a.readlines()
+                self.assertEqual(lines, b.readlines())
+        self.assertEqual(50, len(lines))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Unit tests for the uci_fetch module, run against local stand-in mirrors."""
+from functools import partial
+import hashlib
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from uci_fetch import *
+
+FILES = {
+    'auto-mpg.data': b'18.0   8   307.0      130.0      3504.      12.0   70  1\t"chevrolet chevelle malibu"\n' * 200,
+    'auto-mpg.data-original': b'18.0   8   307.0   130.0   3504.   12.0   70   1\t"chevrolet chevelle malibu"\n' * 200,
+    'auto-mpg.names': b'1. Title: Auto-Mpg Data\n'
+}
+CHECKSUMS = { name: hashlib.sha256(body).hexdigest() for name, body in FILES.items() }
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # racing clients hang up on the losing mirrors mid-response
+        pass
+
+class BrokenHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        self.send_error(500)
+
+    def log_message(self, format, *args):
+        pass
+
+class CorruptHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        body = b'not the file you are looking for'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class SlowHandler(QuietHandler):
+    def do_GET(self):
+        time.sleep(1)
+        super().do_GET()
+
+class TestFetch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # serve the stand-in files from a temporary directory
+        cls.source = tempfile.TemporaryDirectory()
+        for name, body in FILES.items():
+            with open(os.path.join(cls.source.name, name), 'wb') as f:
+                f.write(body)
+        cls.servers = {}
+        for kind, handler in [('good', QuietHandler), ('slow', SlowHandler), ('broken', BrokenHandler), ('corrupt', CorruptHandler)]:
+            server = QuietServer(('127.0.0.1', 0), partial(handler, directory= cls.source.name))
+            threading.Thread(target= server.serve_forever, daemon= True).start()
+            cls.servers[kind] = server
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers.values():
+            server.shutdown()
+            server.server_close()
+        cls.source.cleanup()
+
+    def setUp(self):
+        self.out = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.out.cleanup()
+
+    def mirror(self, kind):
+        return f'http://127.0.0.1:{self.servers[kind].server_address[1]}/'
+
+    def assertFetched(self, results):
+        self.assertEqual(len(FILES), len(results))
+        for result in results:
+            with open(result.path, 'rb') as f:
+                self.assertEqual(FILES[result.name], f.read())
+            self.assertEqual(len(FILES[result.name]), result.bytes)
+            self.assertGreater(result.bandwidth, 0)
+        # no partial downloads left behind
+        self.assertFalse([name for name in os.listdir(self.out.name) if name.endswith('.part')])
+
+    def test_fetch_all(self):
+        results = fetch(CHECKSUMS, [self.mirror('good')], self.out.name)
+        self.assertFetched(results)
+        # auto-mpg.data is saved under the name the rest of the program expects
+        self.assertTrue(os.path.exists(os.path.join(self.out.name, 'auto-mpg.data.txt')))
+
+    def test_failover(self):
+        mirrors = [self.mirror('broken'), self.mirror('corrupt'), self.mirror('good')]
+        results = fetch(CHECKSUMS, mirrors, self.out.name)
+        self.assertFetched(results)
+        self.assertTrue(all(result.url.startswith(self.mirror('good')) for result in results))
+
+    def test_race(self):
+        mirrors = [self.mirror('slow'), self.mirror('corrupt'), self.mirror('good')]
+        start = time.perf_counter()
+        results = fetch(CHECKSUMS, mirrors, self.out.name, race= True)
+        self.assertFetched(results)
+        self.assertTrue(all(result.url.startswith(self.mirror('good')) for result in results))
+        # the slow mirror was not waited on
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_all_mirrors_fail(self):
+        with self.assertRaises(FetchError) as context:
+            fetch(CHECKSUMS, [self.mirror('broken')], self.out.name)
+        self.assertEqual(500, context.exception.status)
+
+    def test_checksum_mismatch(self):
+        with self.assertRaises(FetchError):
+            fetch(CHECKSUMS, [self.mirror('corrupt')], self.out.name, race= True)
+        self.assertFalse(os.listdir(self.out.name))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+"""Concurrent, multi-mirror downloader for the UCI auto-mpg files.
+
+Every file is fetched concurrently with asyncio. For each file the mirrors are either tried in order (failover) or all
+at once with the first verified copy winning (race). Downloads are streamed to a temporary file while being hashed, so
+a copy only replaces the destination once its SHA-256 matches the expected checksum.
+"""
+from collections import namedtuple
+import asyncio
+import hashlib
+import logging
+import os
+import ssl
+import time
+from urllib.parse import urljoin, urlsplit
+
+logger = logging.getLogger(__name__)
+
+## base URLs that serve the auto-mpg files; tried in this order when failing over
+MIRRORS = [
+    'https://archive.ics.uci.edu/ml/machine-learning-databases/auto-mpg/'
+]
+
+## file name on the mirror -> expected SHA-256 (None skips verification); taken from the copies in week6/data
+UCI_FILES = {
+    'auto-mpg.data': '48b830e11feee5572525f8f1691ddb9d38d3d7b7063edcd8fca672c2a5e17d8d',
+    'auto-mpg.data-original': '57c15897a86fe1bdddb96416698f3dbb064164eb80c0a1eea011eb7674bc0094',
+    'auto-mpg.names': 'f6ac336f3b11955d71adee2100faf30f8c1be20e6727476836d437d35804599c'
+}
+
+## file name on the mirror -> local file name, for files the rest of the program expects under another name
+LOCAL_NAMES = {
+    'auto-mpg.data': 'auto-mpg.data.txt'
+}
+
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+
+## one successful download: where it came from, where it went and how fast it was
+FetchResult = namedtuple('FetchResult', ['name', 'url', 'path', 'bytes', 'seconds', 'bandwidth', 'sha256'])
+
+class FetchError(Exception):
+    """Raised when no mirror produced a verified copy of a file."""
+    def __init__(self, message, status= None):
+        super().__init__(message)
+        self.status = status
+
+async def _open(url, timeout):
+    """Sends a GET for url, following redirects, and returns (status, headers, reader, writer) once headers are in."""
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl= ssl.create_default_context() if secure else None), timeout)
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: autompg\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if status in (301, 302, 303, 307, 308) and 'location' in headers:
+            writer.close()
+            url = urljoin(url, headers['location'])
+            continue
+        return status, headers, reader, writer
+    raise FetchError(f'Too many redirects for {url}')
+
+async def _body(reader, headers, timeout):
+    """Yields the response body in chunks, handling chunked transfer encoding and Content-Length."""
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await asyncio.wait_for(reader.readline(), timeout)).split(b';')[0], 16)
+            if size == 0:
+                break
+            yield await asyncio.wait_for(reader.readexactly(size), timeout)
+            await reader.readline()
+    elif 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining:
+            chunk = await asyncio.wait_for(reader.read(min(CHUNK_SIZE, remaining)), timeout)
+            if not chunk:
+                raise FetchError('Connection closed before the full body arrived')
+            remaining -= len(chunk)
+            yield chunk
+    else:
+        while True:
+            chunk = await asyncio.wait_for(reader.read(CHUNK_SIZE), timeout)
+            if not chunk:
+                break
+            yield chunk
+
+async def _download(url, checksum, tmp_path, timeout):
+    """Streams url to tmp_path while hashing it and returns (bytes, seconds, sha256); raises FetchError on a bad
+    status or checksum."""
+    start = time.perf_counter()
+    status, headers, reader, writer = await _open(url, timeout)
+    try:
+        if status != 200:
+            raise FetchError(f'{url} returned status code {status}', status)
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, 'wb') as out:
+            async for chunk in _body(reader, headers, timeout):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    finally:
+        writer.close()
+    if checksum is not None and digest.hexdigest() != checksum:
+        raise FetchError(f'{url} failed checksum verification (got {digest.hexdigest()})')
+    return size, time.perf_counter() - start, digest.hexdigest()
+
+async def fetch_file(name, mirrors, checksum= None, path= None, race= False, timeout= 30):
+    """Downloads one file from the first mirror that serves a verified copy and returns a FetchResult.
+
+    Arguments
+    ---------
+    name: str; required
+    The file name on the mirrors.
+
+    mirrors: list; required
+    Base URLs to fetch from.
+
+    checksum: str; optional
+    The expected SHA-256 hex digest; None skips verification.
+
+    path: str; optional
+    Where to save the file; defaults to name in the working directory.
+
+    race: bool; optional
+    Query every mirror at once and keep the first verified copy, instead of trying them in order.
+
+    timeout: float; optional
+    Seconds to wait on any single network operation.
+    """
+    path = path or name
+    urls = [urljoin(mirror if mirror.endswith('/') else mirror + '/', name) for mirror in mirrors]
+    tmp_paths = [f'{path}.{index}.part' for index in range(len(urls))]
+    errors = []
+
+    def _done(index, outcome):
+        size, seconds, sha256 = outcome
+        os.replace(tmp_paths[index], path)
+        bandwidth = size / seconds if seconds else float('inf')
+        logger.debug(f'fetched {urls[index]}: {size} bytes in {seconds:.3f}s ({bandwidth / 1024:.1f} KiB/s)')
+        return FetchResult(name, urls[index], path, size, seconds, bandwidth, sha256)
+
+    try:
+        if not race:
+            ## failover: walk the mirrors in order
+            for index, url in enumerate(urls):
+                try:
+                    return _done(index, await _download(url, checksum, tmp_paths[index], timeout))
+                except (FetchError, OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    logger.info(f'mirror failed for {name}: {e}')
+                    errors.append(e)
+        else:
+            ## race: every mirror at once, first verified copy wins and the rest are cancelled
+            tasks = { asyncio.ensure_future(_download(url, checksum, tmp_paths[index], timeout)): index
+                      for index, url in enumerate(urls) }
+            pending = set(tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when= asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            return _done(tasks[task], task.result())
+                        logger.info(f'mirror failed for {name}: {task.exception()}')
+                        errors.append(task.exception())
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions= True)
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    status = next((e.status for e in reversed(errors) if getattr(e, 'status', None)), None)
+    raise FetchError(f'No mirror served a verified copy of {name}: {"; ".join(map(str, errors))}', status)
+
+async def fetch_all(files= UCI_FILES, mirrors= MIRRORS, directory= '.', race= False, timeout= 30):
+    """Downloads every file concurrently and returns their FetchResults; raises the first FetchError after all
+    downloads have finished.
+
+    Arguments
+    ---------
+    files: dict; optional
+    File name on the mirrors -> expected SHA-256 (or None).
+
+    mirrors: list; optional
+    Base URLs to fetch from.
+
+    directory: str; optional
+    Where to save the files; names are mapped through LOCAL_NAMES.
+
+    race: bool; optional
+    Race the mirrors for each file instead of failing over in order.
+
+    timeout: float; optional
+    Seconds to wait on any single network operation.
+    """
+    results = await asyncio.gather(*(
+        fetch_file(name, mirrors, checksum, os.path.join(directory, LOCAL_NAMES.get(name, name)), race, timeout)
+        for name, checksum in files.items()
+    ), return_exceptions= True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+def fetch(files= UCI_FILES, mirrors= MIRRORS, directory= '.', race= False, timeout= 30):
+    """Synchronous wrapper around fetch_all()."""
+    return asyncio.run(fetch_all(files, mirrors, directory, race, timeout))